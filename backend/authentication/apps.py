@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+    
+    def ready(self):
+        from order_management.sites import copy_user_to_site_database, delete_user_from_site_databases
+        # Copie des utilisateurs dans la base de leur site (SITE_DATABASES)
+        post_save.connect(copy_user_to_site_database, sender=self.get_model('User'))
+        post_delete.connect(delete_user_from_site_databases, sender=self.get_model('User'))
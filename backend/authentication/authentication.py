@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from order_management.sites import set_current_site, use_site
+
+
+def user_cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    """À appeler après toute modification du rôle, du mot de passe ou du statut d'un utilisateur"""
+    cache.delete(user_cache_key(user_id))
+
+
+class UserRefreshToken(RefreshToken):
+    """Jeton JWT contenant le rôle et le nom affiché de l'utilisateur"""
+    
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        # Copiées dans le jeton d'accès dérivé de ce jeton de rafraîchissement
+        token['role'] = user.role
+        token['name'] = f"{user.first_name} {user.last_name}".strip() or user.username
+        token['site'] = user.site
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Authentification JWT qui évite de relire l'utilisateur en base à chaque
+    requête : l'utilisateur est conservé dans le cache du processus pendant
+    AUTH_USER_CACHE_TTL secondes.
+    
+    Le site de l'utilisateur devient le site courant de la requête : les
+    commandes et les utilisateurs lus ensuite sont restreints à ce site.
+    """
+    
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            set_current_site(result[0].site)
+        return result
+    
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Lecture en base, avec les vérifications habituelles (utilisateur actif...),
+            # toujours dans l'annuaire `default` et non dans la copie de la base du site
+            with use_site(None):
+                user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TTL)
+        return user
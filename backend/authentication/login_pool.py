@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import threading
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class LoginPoolBusy(Exception):
+    """Le pool de hachage n'a pas pu traiter la connexion à temps"""
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.LOGIN_HASH_WORKERS,
+                    thread_name_prefix='login-hash'
+                )
+    return _executor
+
+
+def _authenticate(credentials):
+    # Les threads du pool ne passent pas par le cycle requête/réponse de
+    # Django : leurs connexions à la base sont recyclées ici
+    close_old_connections()
+    try:
+        return authenticate(**credentials)
+    finally:
+        close_old_connections()
+
+
+def authenticate_in_pool(**credentials):
+    """
+    Exécute authenticate() dans un pool de threads borné.
+    
+    Le hachage PBKDF2 du mot de passe est coûteux en CPU : lors des vagues de
+    connexions en début de poste, au plus LOGIN_HASH_WORKERS hachages sont
+    calculés en parallèle, les autres requêtes de l'API gardent la main.
+    Lève LoginPoolBusy si la connexion n'a pas été traitée après
+    LOGIN_HASH_TIMEOUT secondes.
+    """
+    future = _get_executor().submit(_authenticate, credentials)
+    try:
+        return future.result(timeout=settings.LOGIN_HASH_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise LoginPoolBusy()
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:37
+
+import authentication.models
+import django.contrib.auth.models
+import order_management.sites
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_alter_user_role'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', authentication.models.SiteUserManager()),
+                ('all_sites', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='site',
+            field=models.CharField(db_index=True, default=order_management.sites.default_site, max_length=50),
+        ),
+    ]
@@ -1,5 +1,12 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
+
+from order_management.sites import SiteManagerMixin, default_site
+
+
+class SiteUserManager(SiteManagerMixin, UserManager):
+    pass
+
 
 # Create your models here.
 class User(AbstractUser):
@@ -10,6 +17,12 @@ class User(AbstractUser):
     )
     
     role = models.CharField(max_length=15, choices=ROLE_CHOICES, default='AGENT')
+    # Entrepôt de rattachement (voir order_management/sites.py)
+    site = models.CharField(max_length=50, default=default_site, db_index=True)
+    
+    # Utilisateurs du site courant ; all_sites pour la connexion et l'administration
+    objects = SiteUserManager()
+    all_sites = UserManager()
     
     def is_agent(self):
         return self.role == 'AGENT'
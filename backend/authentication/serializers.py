@@ -1,6 +1,7 @@
 from rest_framework import serializers
-from django.contrib.auth import authenticate
+from rest_framework.exceptions import Throttled
 from .models import User
+from .login_pool import authenticate_in_pool, LoginPoolBusy
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -42,7 +43,10 @@ class LoginSerializer(serializers.Serializer):
                 'Un mot de passe est requis pour se connecter.'
             )
         
-        user = authenticate(username=username, password=password)
+        try:
+            user = authenticate_in_pool(username=username, password=password)
+        except LoginPoolBusy:
+            raise Throttled(wait=1, detail='Trop de connexions simultanées, veuillez réessayer.')
         
         if user is None:
             raise serializers.ValidationError(
@@ -54,7 +58,8 @@ class LoginSerializer(serializers.Serializer):
                 'Cet utilisateur a été désactivé.'
             )
         
+        # L'utilisateur authentifié est transmis à la vue pour éviter une nouvelle requête
         return {
             'username': user.username,
-            'token': user.id
+            'user': user
         }
@@ -2,9 +2,9 @@ from django.shortcuts import render, get_object_or_404
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from .serializers import UserSerializer, RegisterSerializer, LoginSerializer
 from .models import User
+from .authentication import UserRefreshToken, invalidate_cached_user
 from django.contrib.auth.hashers import make_password
 
 # Create your views here.
@@ -18,7 +18,7 @@ class RegisterView(APIView):
         user = serializer.save()
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = UserRefreshToken.for_user(user)
         
         return Response({
             'user': UserSerializer(user).data,
@@ -34,10 +34,10 @@ class LoginView(APIView):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        user = User.objects.get(username=serializer.validated_data['username'])
+        user = serializer.validated_data['user']
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = UserRefreshToken.for_user(user)
         
         return Response({
             'user': UserSerializer(user).data,
@@ -104,10 +104,12 @@ class UserDetailView(APIView):
             password = data.pop('password')
             user.password = make_password(password)
             user.save()
+            invalidate_cached_user(user.id)
         
         serializer = UserSerializer(user, data=data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            invalidate_cached_user(user.id)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -122,6 +124,7 @@ class UserDetailView(APIView):
         
         user = self.get_object(pk)
         user.delete()
+        invalidate_cached_user(pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -145,6 +148,7 @@ class UserRoleView(APIView):
         
         user.role = role
         user.save()
+        invalidate_cached_user(user.id)
         
         serializer = UserSerializer(user)
         return Response(serializer.data)
@@ -166,5 +170,6 @@ class UserPasswordResetView(APIView):
         
         user.password = make_password(password)
         user.save()
+        invalidate_cached_user(user.id)
         
         return Response({"message": "Mot de passe réinitialisé avec succès"}, status=status.HTTP_200_OK)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Mesure la capacité d'un processus serveur à tenir des connexions simultanées
+sur les vues en lecture (listes des modules, tableau de bord, PrestaShop).
+
+Chaque client simulé rejoue la même requête en boucle pendant la durée donnée,
+comme un poste qui rafraîchit sa liste ou un tableau de bord ouvert.
+Lancer le script contre les deux déploiements pour comparer :
+
+    # WSGI, vues synchrones (un worker, 4 threads)
+    ASYNC_READ_VIEWS=0 gunicorn order_management.wsgi --workers 1 --threads 4
+    # ASGI, vues asynchrones (un worker)
+    uvicorn order_management.asgi:application --workers 1
+
+Utilisation: python bench_concurrency.py --path /orders/dashboard/ --clients 10,50,200 --duration 20
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import requests
+
+BASE_URL = "http://localhost:8000/api"
+
+
+def get_token(username, password):
+    response = requests.post(f"{BASE_URL}/auth/login/", data={
+        "username": username,
+        "password": password
+    })
+    response.raise_for_status()
+    return response.json()["access"]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run_clients(url, token, clients, duration, timeout):
+    """Lance `clients` clients en parallèle, retourne (durées des succès, erreurs)"""
+    durations = []
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    
+    def client():
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token}"
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status_code = session.get(url, timeout=timeout).status_code
+            except requests.RequestException as e:
+                status_code = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status_code == 200:
+                    durations.append(elapsed)
+                else:
+                    errors[status_code] = errors.get(status_code, 0) + 1
+    
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return durations, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des connexions simultanées sur une vue en lecture")
+    parser.add_argument('--path', default='/orders/dashboard/')
+    parser.add_argument('--clients', default='10,50,100,200',
+                        help="Nombres de clients simultanés à tester, séparés par des virgules")
+    parser.add_argument('--duration', type=float, default=20, help="Durée de chaque palier (secondes)")
+    parser.add_argument('--timeout', type=float, default=10, help="Délai maximal d'une requête (secondes)")
+    parser.add_argument('--username', default='manager1')
+    parser.add_argument('--password', default='password123')
+    args = parser.parse_args()
+    
+    token = get_token(args.username, args.password)
+    url = f"{BASE_URL}{args.path}"
+    
+    print(f"GET {url}")
+    print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  erreurs")
+    for clients in (int(value) for value in args.clients.split(',')):
+        durations, errors = run_clients(url, token, clients, args.duration, args.timeout)
+        if durations:
+            print(f"{clients:>8} {len(durations) / args.duration:>8.1f} "
+                  f"{statistics.median(durations) * 1000:>8.0f} "
+                  f"{percentile(durations, 95) * 1000:>8.0f} "
+                  f"{percentile(durations, 99) * 1000:>8.0f}  {errors or ''}")
+        else:
+            print(f"{clients:>8} {'-':>8} {'-':>8} {'-':>8} {'-':>8}  {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Mesure le débit de connexion (POST /api/auth/login/) avec des connexions simultanées,
+comme lors d'une prise de poste.
+Utilisation: python bench_login.py --concurrency 20 --requests 200 --username agent1 --password password123
+Le serveur doit être lancé (python manage.py runserver ou un serveur WSGI/ASGI).
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://localhost:8000/api"
+
+
+def login(username, password):
+    """Effectue une connexion et retourne (code HTTP, durée en secondes)"""
+    start = time.perf_counter()
+    try:
+        response = requests.post(f"{BASE_URL}/auth/login/", data={
+            "username": username,
+            "password": password
+        })
+        status_code = response.status_code
+    except requests.RequestException:
+        status_code = None
+    return status_code, time.perf_counter() - start
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du débit de connexion")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--username', default='agent1')
+    parser.add_argument('--password', default='password123')
+    args = parser.parse_args()
+    
+    print(f"{args.requests} connexions, {args.concurrency} en parallèle...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(
+            lambda _: login(args.username, args.password), range(args.requests)
+        ))
+    elapsed = time.perf_counter() - start
+    
+    durations = [duration for status_code, duration in results if status_code == 200]
+    errors = {}
+    for status_code, duration in results:
+        if status_code != 200:
+            errors[status_code] = errors.get(status_code, 0) + 1
+    
+    print(f"Durée totale: {elapsed:.2f} s")
+    print(f"Débit: {len(durations) / elapsed:.1f} connexions/s")
+    if durations:
+        print(f"Latence moyenne: {statistics.mean(durations) * 1000:.0f} ms")
+        print(f"p50: {percentile(durations, 50) * 1000:.0f} ms, "
+              f"p95: {percentile(durations, 95) * 1000:.0f} ms, "
+              f"p99: {percentile(durations, 99) * 1000:.0f} ms")
+    if errors:
+        print(f"Erreurs: {errors}")
+
+
+if __name__ == "__main__":
+    main()
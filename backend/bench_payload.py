@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Compare la taille et le coût CPU de la réponse de GET /api/orders/?date=all :
+rendu JSON standard de DRF contre orjson, puis compression gzip / brotli.
+Utilise la base configurée (python create_test_data.py pour la remplir).
+Utilisation: python bench_payload.py --username admin --iterations 20
+"""
+
+import os
+import argparse
+import time
+
+import django
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order_management.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from order_management.renderers import ORJSONRenderer
+from order_management.middleware import brotli
+from django.conf import settings
+
+User = get_user_model()
+
+
+def cpu_time(func, iterations):
+    """Temps CPU moyen (en millisecondes) d'un appel à func"""
+    start = time.process_time()
+    for _ in range(iterations):
+        result = func()
+    return (time.process_time() - start) / iterations * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du rendu et de la compression des listes de commandes")
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--path', default='/api/orders/?date=all')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+    
+    client = APIClient(HTTP_HOST='localhost')
+    client.force_authenticate(user=User.objects.get(username=args.username))
+    response = client.get(args.path)
+    data = response.data
+    print(f"GET {args.path} : {len(data.get('results', data)) if isinstance(data, dict) else len(data)} commandes")
+    
+    print(f"{'':<24} {'octets':>10} {'CPU ms':>8}")
+    json_ms, json_content = cpu_time(lambda: JSONRenderer().render(data), args.iterations)
+    print(f"{'json (avant)':<24} {len(json_content):>10} {json_ms:>8.2f}")
+    orjson_ms, content = cpu_time(lambda: ORJSONRenderer().render(data), args.iterations)
+    print(f"{'orjson':<24} {len(content):>10} {orjson_ms:>8.2f}")
+    
+    gzip_ms, gzipped = cpu_time(lambda: compress_string(content), args.iterations)
+    print(f"{'orjson + gzip':<24} {len(gzipped):>10} {orjson_ms + gzip_ms:>8.2f}")
+    if brotli is not None:
+        brotli_ms, compressed = cpu_time(
+            lambda: brotli.compress(content, quality=settings.RESPONSE_BROTLI_QUALITY), args.iterations
+        )
+        print(f"{'orjson + brotli':<24} {len(compressed):>10} {orjson_ms + brotli_ms:>8.2f}")
+    else:
+        print("brotli non installé (pip install brotli)")
+
+
+if __name__ == "__main__":
+    main()
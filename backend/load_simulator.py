@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+"""
+Simule un pic d'activité : N agents qui, en parallèle, créent, préparent
+(avec line_count), contrôlent et emballent des commandes par les vrais endpoints.
+
+Par défaut les requêtes passent par le client de test Django, dans ce
+processus, sur la base configurée (DB_ENGINE=sqlite ou postgres) ; avec
+--base-url, elles sont envoyées à un serveur lancé.
+
+Rapporte le débit, les percentiles de latence par étape, les taux d'erreur,
+de conflits (409) et d'erreurs de verrouillage, ainsi que les attentes de
+verrous observées sur PostgreSQL (pg_stat_activity).
+
+Utilisation: python load_simulator.py --agents 20 --duration 60 [--base-url http://localhost:8000/api] [--cleanup]
+"""
+
+import os
+import argparse
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import django
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order_management.settings')
+django.setup()
+
+import requests
+from django.db import connection, connections
+from django.test import Client
+from authentication.authentication import UserRefreshToken
+from authentication.models import User
+from orders.models import Order, OrderEvent
+
+# Préfixe des commandes et des agents créés par la simulation
+REFERENCE_PREFIX = 'LOADSIM-'
+AGENT_PREFIX = 'loadsim-agent-'
+
+# Étapes d'une commande après sa création : (nom, URL de validation)
+STAGES = (
+    ('prepare', "/orders/{}/prepare/"),
+    ('control', "/orders/{}/control/"),
+    ('pack', "/orders/{}/pack/"),
+)
+
+
+def is_lock_error(text):
+    text = text.lower()
+    return any(marker in text for marker in ('database is locked', 'deadlock', 'lock timeout', 'could not obtain lock'))
+
+
+class Transport:
+    """Envoie les requêtes d'un agent, par le client de test ou en HTTP"""
+    
+    def __init__(self, token, base_url=None):
+        self.base_url = base_url
+        if base_url:
+            self.session = requests.Session()
+            self.session.headers['Authorization'] = f"Bearer {token}"
+        else:
+            self.client = Client(
+                raise_request_exception=False,
+                HTTP_HOST='localhost',
+                HTTP_AUTHORIZATION=f"Bearer {token}"
+            )
+    
+    def post(self, path, data):
+        """Retourne (code HTTP, corps JSON ou None, erreur de verrouillage)"""
+        if self.base_url:
+            response = self.session.post(f"{self.base_url}{path}", json=data)
+            body_text = response.text
+        else:
+            response = self.client.post(f"/api{path}", data, content_type='application/json')
+            exc_info = getattr(response, 'exc_info', None)
+            body_text = str(exc_info[1]) if exc_info else response.content.decode(errors='replace')
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body, response.status_code >= 500 and is_lock_error(body_text)
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.lock_errors = Counter()
+        self.completed_orders = 0
+    
+    def record(self, operation, status_code, duration, lock_error):
+        with self.lock:
+            self.latencies[operation].append(duration)
+            self.statuses[operation][status_code] += 1
+            if lock_error:
+                self.lock_errors[operation] += 1
+
+
+class LockSampler:
+    """Compte, sur PostgreSQL, les sessions bloquées en attente d'un verrou"""
+    
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+    
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                while not self.stopped.wait(self.interval):
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity "
+                        "WHERE wait_event_type = 'Lock' AND datname = current_database()"
+                    )
+                    self.samples.append(cursor.fetchone()[0])
+        finally:
+            connection.close()
+    
+    def start(self):
+        self.thread.start()
+    
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def agent_loop(agent_index, token, args, stats, deadline):
+    transport = Transport(token, args.base_url)
+    try:
+        while time.perf_counter() < deadline:
+            reference = f"{REFERENCE_PREFIX}{uuid.uuid4().hex[:12].upper()}"
+            start = time.perf_counter()
+            status_code, body, lock_error = transport.post("/orders/", {
+                'reference': reference,
+                'cart_number': f"{REFERENCE_PREFIX}{agent_index:03d}",
+                'line_count': 1
+            })
+            stats.record('create', status_code, time.perf_counter() - start, lock_error)
+            if status_code != 201:
+                continue
+            
+            order_id = body['id']
+            for stage, url in STAGES:
+                data = {'line_count': random.randint(1, 30)} if stage == 'prepare' else {}
+                start = time.perf_counter()
+                status_code, body, lock_error = transport.post(url.format(order_id), data)
+                stats.record(stage, status_code, time.perf_counter() - start, lock_error)
+                if status_code != 200:
+                    break
+                if args.think_time:
+                    time.sleep(random.uniform(0, args.think_time))
+            else:
+                with stats.lock:
+                    stats.completed_orders += 1
+    finally:
+        # Chaque thread a sa propre connexion (mode client de test)
+        connections.close_all()
+
+
+def create_agents(count):
+    """Crée (ou réutilise) les agents de la simulation et retourne leurs jetons d'accès"""
+    tokens = []
+    for index in range(count):
+        user, created = User.objects.get_or_create(
+            username=f"{AGENT_PREFIX}{index:03d}",
+            defaults={'role': 'AGENT', 'first_name': 'Simulation', 'last_name': str(index)}
+        )
+        if created:
+            user.set_unusable_password()
+            user.save()
+        tokens.append(str(UserRefreshToken.for_user(user).access_token))
+    return tokens
+
+
+def cleanup():
+    orders = Order.objects.filter(reference__startswith=REFERENCE_PREFIX)
+    count = orders.count()
+    OrderEvent.objects.filter(order__in=orders).delete()
+    orders.delete()
+    User.objects.filter(username__startswith=AGENT_PREFIX).delete()
+    print(f"Nettoyage : {count} commande(s) de simulation supprimée(s)")
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def report(stats, elapsed, lock_sampler, interval):
+    print(f"\nDurée: {elapsed:.1f} s - base: {connection.vendor}")
+    print(f"Commandes emballées: {stats.completed_orders} ({stats.completed_orders / elapsed * 60:.0f}/min)")
+    total_requests = sum(len(latencies) for latencies in stats.latencies.values())
+    print(f"Requêtes: {total_requests} ({total_requests / elapsed:.1f}/s)\n")
+    
+    print(f"{'étape':<8} {'requêtes':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'erreurs':>8} {'409':>6} {'verrous':>8}")
+    for operation in ('create', 'prepare', 'control', 'pack'):
+        latencies = stats.latencies.get(operation)
+        if not latencies:
+            continue
+        statuses = stats.statuses[operation]
+        errors = sum(count for status_code, count in statuses.items() if status_code >= 400 and status_code != 409)
+        print(f"{operation:<8} {len(latencies):>9} "
+              f"{statistics.median(latencies) * 1000:>8.0f} "
+              f"{percentile(latencies, 95) * 1000:>8.0f} "
+              f"{percentile(latencies, 99) * 1000:>8.0f} "
+              f"{errors / len(latencies):>8.1%} "
+              f"{statuses[409] / len(latencies):>6.1%} "
+              f"{stats.lock_errors[operation]:>8}")
+    
+    if lock_sampler and lock_sampler.samples:
+        samples = lock_sampler.samples
+        print(f"\nAttentes de verrous (PostgreSQL) : moyenne {statistics.mean(samples):.2f} session(s), "
+              f"maximum {max(samples)}, cumul ~{sum(samples) * interval:.1f} s")
+    elif connection.vendor == 'sqlite':
+        print("\nSQLite : attentes de verrous non observables, voir la colonne « verrous » (database is locked)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation de charge du flux entrepôt")
+    parser.add_argument('--agents', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30, help="Durée de la simulation (secondes)")
+    parser.add_argument('--think-time', type=float, default=0, help="Pause maximale entre deux étapes (secondes)")
+    parser.add_argument('--base-url', help="URL de l'API d'un serveur lancé (client de test par défaut)")
+    parser.add_argument('--cleanup', action='store_true', help="Supprime les données de simulation à la fin")
+    args = parser.parse_args()
+    
+    tokens = create_agents(args.agents)
+    stats = Stats()
+    
+    sample_interval = 0.1
+    lock_sampler = LockSampler(sample_interval) if connection.vendor == 'postgresql' else None
+    if lock_sampler:
+        lock_sampler.start()
+    
+    print(f"{args.agents} agents pendant {args.duration:.0f} s "
+          f"({args.base_url or 'client de test, base ' + connection.vendor})...")
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [
+        threading.Thread(target=agent_loop, args=(index, token, args, stats, deadline))
+        for index, token in enumerate(tokens)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    if lock_sampler:
+        lock_sampler.stop()
+    report(stats, elapsed, lock_sampler, sample_interval)
+    
+    if args.cleanup:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
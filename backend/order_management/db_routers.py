@@ -0,0 +1,77 @@
+"""
+Lectures des vues de reporting sur une réplique de la base (REPLICA_DATABASE).
+
+Seules les requêtes en lecture des vues utilisant ReplicaReadMixin (tableau
+de bord, statistiques et export des commandes, rapprochement PrestaShop) lisent
+la réplique ; tout le reste, écritures comprises, passe par `default`.
+
+Lecture de ses propres écritures : après toute écriture sur une commande
+(création, transition, modification, suppression, réservation ou libération),
+les vues de reporting de cet utilisateur relisent `default` pendant
+REPLICA_STICKY_SECONDS, le temps que la réplique rattrape son retard. Le
+marqueur est conservé dans le cache Django : avec plusieurs processus, il faut
+un cache partagé (Redis, memcached ou base de données).
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+# Vrai pendant le traitement d'une requête autorisée à lire la réplique
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def sticky_cache_key(user_id):
+    return f'replica_sticky:{user_id}'
+
+
+def mark_recent_write(user):
+    """Les lectures de reporting de l'utilisateur restent sur `default` pendant REPLICA_STICKY_SECONDS"""
+    if settings.REPLICA_DATABASE and user is not None and user.pk is not None:
+        cache.set(sticky_cache_key(user.pk), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def has_recent_write(user):
+    return bool(user.pk) and cache.get(sticky_cache_key(user.pk), False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.REPLICA_DATABASE and _replica_reads.get():
+            return settings.REPLICA_DATABASE
+        return None
+    
+    def db_for_write(self, model, **hints):
+        return None
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mêmes données des deux côtés : un objet lu sur la réplique peut être lié à un objet de `default`
+        databases = {'default', settings.REPLICA_DATABASE}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplique reçoit le schéma par la réplication
+        if settings.REPLICA_DATABASE and db == settings.REPLICA_DATABASE:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Vue (APIView synchrone ou asynchrone) dont les requêtes GET lisent la
+    réplique, sauf pour un utilisateur ayant écrit récemment.
+    """
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Après l'authentification : l'utilisateur est connu
+        if request.method in SAFE_METHODS and not has_recent_write(request.user):
+            _replica_reads.set(True)
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Pas de jeton de réinitialisation : sous adrf, initial() s'exécute dans un autre contexte
+        _replica_reads.set(False)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,83 @@
+"""
+Mesure de la mémoire allouée par les requêtes des routes MEMORY_PROFILE_ROUTES
+(noms d'URL, par exemple `order-list-create,presta-orders`).
+
+Pour chaque requête mesurée, tracemalloc relève le pic d'allocation et les
+lignes de code qui retiennent le plus de mémoire en fin de requête. Ils sont
+journalisés et renvoyés dans les en-têtes `X-Memory-Peak-KB` et `X-Memory-Top`.
+
+tracemalloc mesure tout le processus : une seule requête est mesurée à la fois
+et les allocations des autres threads pendant ce temps sont comptées avec elle.
+Le traçage ralentit fortement la requête, à n'activer que pour un diagnostic.
+"""
+import logging
+import os
+import threading
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+# Lignes reprises dans l'en-tête X-Memory-Top (les autres ne sont que journalisées)
+HEADER_TOP_LINES = 3
+
+
+def short_filename(filename):
+    """Chemin relatif au projet, ou à site-packages pour les dépendances"""
+    base_dir = str(settings.BASE_DIR)
+    if filename.startswith(base_dir):
+        return filename[len(base_dir) + 1:]
+    if 'site-packages' in filename:
+        return filename.split('site-packages' + os.sep, 1)[1]
+    return filename
+
+
+class MemoryProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.MEMORY_PROFILE_ROUTES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.lock = threading.Lock()
+    
+    def is_profiled(self, request):
+        try:
+            return resolve(request.path_info).url_name in settings.MEMORY_PROFILE_ROUTES
+        except Resolver404:
+            return False
+    
+    def __call__(self, request):
+        # Une requête déjà mesurée (ou un tracemalloc lancé ailleurs) : pas de mesure
+        if not self.is_profiled(request) or tracemalloc.is_tracing() or not self.lock.acquire(blocking=False):
+            return self.get_response(request)
+        
+        try:
+            tracemalloc.start()
+            try:
+                response = self.get_response(request)
+                peak = tracemalloc.get_traced_memory()[1]
+                snapshot = tracemalloc.take_snapshot()
+            finally:
+                tracemalloc.stop()
+        finally:
+            self.lock.release()
+        
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ))
+        top_lines = [
+            (f"{short_filename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", stat.size // 1024)
+            for stat in snapshot.statistics('lineno')[:settings.MEMORY_PROFILE_TOP_LINES]
+        ]
+        
+        logger.info(
+            "Mémoire %s %s : pic %d Ko ; lignes retenant le plus de mémoire : %s",
+            request.method, request.path, peak // 1024,
+            ', '.join(f"{line} ({size} Ko)" for line, size in top_lines)
+        )
+        response['X-Memory-Peak-KB'] = str(peak // 1024)
+        response['X-Memory-Top'] = ', '.join(f"{line}={size}KB" for line, size in top_lines[:HEADER_TOP_LINES])
+        return response
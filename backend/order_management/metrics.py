@@ -0,0 +1,230 @@
+"""
+Métriques au format texte de Prometheus, exposées sur /metrics.
+
+Les compteurs (transitions, requêtes) et histogrammes (latence par route)
+sont tenus en mémoire par chaque processus : une lecture de /metrics ne fait
+que les formater. La profondeur des files d'attente est mise à jour en
+mémoire à chaque création, transition et suppression de commande validée
+par ce processus, et recomptée en base (index partiel des commandes non
+emballées) au premier besoin puis, lors d'une lecture de /metrics, toutes les
+METRICS_QUEUE_RESEED_SECONDS secondes : les changements faits par les autres
+workers et par les commandes de gestion y sont ainsi repris.
+
+Avec plusieurs workers, chacun expose ses propres compteurs et histogrammes.
+La profondeur des files est un total de la base commune, le même pour chaque
+worker : elle ne s'additionne pas entre workers.
+"""
+import threading
+import time
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from orders.models import Order
+from .sites import site_database, sites_by_database, use_site
+
+# Bornes (en secondes) des histogrammes de latence
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+    
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *label_values, value):
+        with self.lock:
+            self.values[label_values] = value
+    
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+    
+    def render(self):
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+
+class Histogram(Counter):
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+    
+    def observe(self, *label_values, value):
+        with self.lock:
+            # [nombre par borne..., somme, nombre total]
+            series = self.values.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        label_names = (*self.labels, 'le')
+        with self.lock:
+            for label_values, series in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = format_labels(label_names, (*label_values, bound))
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = format_labels(label_names, (*label_values, '+Inf'))
+                lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+                labels = format_labels(self.labels, label_values)
+                lines.append(f'{self.name}_sum{labels} {series[-2]:.6f}')
+                lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+ORDER_TRANSITIONS = Counter(
+    'orders_transitions_total', "Changements de statut des commandes validés",
+    labels=('from_status', 'to_status')
+)
+ORDER_QUEUE_DEPTH = Gauge(
+    'orders_queue_depth', "Commandes en attente de l'étape suivante, par statut",
+    labels=('status',)
+)
+HTTP_REQUESTS = Counter(
+    'http_requests_total', "Requêtes traitées, par route et code HTTP",
+    labels=('method', 'route', 'status')
+)
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', "Durée de traitement des requêtes, par route",
+    labels=('method', 'route')
+)
+
+REGISTRY = (ORDER_TRANSITIONS, ORDER_QUEUE_DEPTH, HTTP_REQUESTS, HTTP_LATENCY)
+
+# Statuts dont la file d'attente est exposée
+QUEUE_STATUSES = ('CREATED', 'PREPARED', 'CONTROLLED')
+
+# Heure (time.monotonic) du dernier comptage en base, None avant le premier
+_queue_seeded_at = None
+_queue_lock = threading.Lock()
+
+
+def _seed_queue_depth():
+    """Compte les files d'attente dans toutes les bases (à appeler avec _queue_lock)"""
+    global _queue_seeded_at
+    counts = dict.fromkeys(QUEUE_STATUSES, 0)
+    with use_site(None):
+        for database in dict.fromkeys(site_database(site) for site in sites_by_database()):
+            # Même condition que l'index partiel order_active_status_idx
+            rows = (
+                Order.objects.using(database).exclude(status='PACKED')
+                .values_list('status')
+                .annotate(count=Count('id'))
+                .order_by()
+            )
+            for status, count in rows:
+                if status in counts:
+                    counts[status] += count
+    for status, count in counts.items():
+        ORDER_QUEUE_DEPTH.set(status, value=count)
+    _queue_seeded_at = time.monotonic()
+
+
+def seed_queue_depth():
+    """Recompte les files d'attente en base si le dernier comptage est trop ancien"""
+    with _queue_lock:
+        if _queue_seeded_at is None or time.monotonic() - _queue_seeded_at >= settings.METRICS_QUEUE_RESEED_SECONDS:
+            _seed_queue_depth()
+
+
+def _move_in_queue(from_status, to_status, count):
+    with _queue_lock:
+        if _queue_seeded_at is None:
+            # Le comptage, fait après le commit, inclut déjà ce changement
+            _seed_queue_depth()
+            return
+        if from_status in QUEUE_STATUSES:
+            ORDER_QUEUE_DEPTH.dec(from_status, amount=count)
+        if to_status in QUEUE_STATUSES:
+            ORDER_QUEUE_DEPTH.inc(to_status, amount=count)
+
+
+def update_queue_depth(from_status=None, to_status=None, count=1):
+    """
+    Fait passer `count` commandes de la file `from_status` à la file
+    `to_status` (None pour une création ou une suppression), après le commit
+    de la transaction en cours de la base du site.
+    """
+    transaction.on_commit(partial(_move_in_queue, from_status, to_status, count), using=site_database())
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Expose les métriques (protégées par METRICS_TOKEN s'il est défini)"""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    
+    seed_queue_depth()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def record_request(request, response, duration):
+    # Motif de la route plutôt que l'URL, pour ne pas créer une série par commande
+    match = getattr(request, 'resolver_match', None)
+    route = match.route if match else 'unmatched'
+    HTTP_REQUESTS.inc(request.method, route, response.status_code)
+    HTTP_LATENCY.observe(request.method, route, value=duration)
+
+
+class MetricsMiddleware:
+    """Mesure la durée et le code de retour de chaque requête"""
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        record_request(request, response, time.perf_counter() - start)
+        return response
+    
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        record_request(request, response, time.perf_counter() - start)
+        return response
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # brotli est facultatif : on se contente alors de gzip
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresse les réponses dépassant RESPONSE_COMPRESSION_MIN_BYTES :
+    brotli si le module est installé et accepté par le client, gzip sinon.
+    
+    Les listes de commandes (objets utilisateur répétés) se compressent très bien ;
+    en dessous du seuil, le gain ne justifie pas le temps CPU.
+    """
+    
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            return response
+        
+        accepts_brotli = re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if brotli is None or response.streaming or not accepts_brotli or response.has_header("Content-Encoding"):
+            return super().process_response(request, response)
+        
+        patch_vary_headers(response, ("Accept-Encoding",))
+        
+        compressed_content = brotli.compress(response.content, quality=settings.RESPONSE_BROTLI_QUALITY)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+        
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        
+        return response
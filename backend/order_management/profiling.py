@@ -0,0 +1,190 @@
+"""
+Profilage à la demande d'une requête de l'API, sans redéploiement.
+
+Un manager obtient un jeton signé (POST /api/orders/diagnostics/profile-token/)
+et l'envoie dans l'en-tête `X-Profile` de la requête à profiler :
+
+    X-Profile: <jeton>
+    X-Profile-Mode: cprofile   (par défaut) ou sampling
+
+- cprofile : profil complet (fichier .prof, à ouvrir avec pstats ou snakeviz) ;
+- sampling : échantillonnage de la pile toutes les PROFILE_SAMPLING_INTERVAL_MS,
+  écrit au format « collapsed stacks » (.collapsed) lu par flamegraph.pl ou speedscope.
+
+Avec PROFILE_SAMPLE_RATE = N, une requête sur N est en plus profilée en mode
+sampling, dont le surcoût est faible. Le nom du fichier écrit dans
+PROFILE_OUTPUT_DIR est renvoyé dans l'en-tête `X-Profile-File`. Le dossier
+garde au plus PROFILE_MAX_FILES profils : les plus anciens sont supprimés.
+
+Seul le thread qui exécute la requête est profilé. Sous ASGI, c'est le thread
+de la boucle d'événements : les vues asynchrones y apparaissent, mais pas les
+vues synchrones, exécutées dans un thread à part.
+"""
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+PROFILE_SALT = 'order_management.profiling'
+
+PROFILE_MODES = ('cprofile', 'sampling')
+
+PROFILE_EXTENSIONS = ('prof', 'collapsed')
+
+
+def make_profile_token(user):
+    """Jeton autorisant le profilage pendant PROFILE_TOKEN_MAX_AGE secondes"""
+    return signing.TimestampSigner(salt=PROFILE_SALT).sign(str(user.id))
+
+
+def check_profile_token(token):
+    try:
+        signing.TimestampSigner(salt=PROFILE_SALT).unsign(token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def profile_filename(request, extension):
+    match = getattr(request, 'resolver_match', None)
+    view_name = re.sub(r'[^\w-]', '_', match.view_name if match else 'unknown')
+    timestamp = timezone.now().strftime('%Y%m%d-%H%M%S-%f')
+    return f"{timestamp}-{view_name}-{uuid.uuid4().hex[:6]}.{extension}"
+
+
+def prune_profiles(directory, max_files):
+    """Supprime les profils les plus anciens au-delà de `max_files` (noms horodatés)"""
+    filenames = sorted(
+        name for name in os.listdir(directory)
+        if name.endswith(tuple(f'.{extension}' for extension in PROFILE_EXTENSIONS))
+    )
+    for name in filenames[:max(len(filenames) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            # Déjà supprimé par un autre worker
+            pass
+
+
+class StackSampler:
+    """Relève périodiquement la pile d'un thread et compte les piles identiques"""
+    
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+    
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+    
+    def __enter__(self):
+        self.thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+    
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """Profile le thread courant pendant le bloc `with`, puis enregistre le profil"""
+    
+    def __init__(self, mode):
+        self.mode = mode
+    
+    def __enter__(self):
+        if self.mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            interval = settings.PROFILE_SAMPLING_INTERVAL_MS / 1000
+            self.sampler = StackSampler(threading.get_ident(), interval).__enter__()
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.duration = time.perf_counter() - self.start
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+        else:
+            self.sampler.__exit__(*exc_info)
+    
+    def save(self, request, response):
+        os.makedirs(settings.PROFILE_OUTPUT_DIR, exist_ok=True)
+        if self.mode == 'cprofile':
+            filename = profile_filename(request, 'prof')
+            self.profiler.dump_stats(os.path.join(settings.PROFILE_OUTPUT_DIR, filename))
+        else:
+            filename = profile_filename(request, 'collapsed')
+            with open(os.path.join(settings.PROFILE_OUTPUT_DIR, filename), 'w') as output:
+                output.write(self.sampler.collapsed())
+            response['X-Profile-Duration-Ms'] = f"{self.duration * 1000:.1f}"
+        prune_profiles(settings.PROFILE_OUTPUT_DIR, settings.PROFILE_MAX_FILES)
+        
+        response['X-Profile-File'] = filename
+        return response
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def get_mode(self, request):
+        token = request.headers.get('X-Profile')
+        if token and check_profile_token(token):
+            mode = request.headers.get('X-Profile-Mode', 'cprofile')
+            return mode if mode in PROFILE_MODES else 'cprofile'
+        rate = settings.PROFILE_SAMPLE_RATE
+        if rate and random.randrange(rate) == 0:
+            return 'sampling'
+        return None
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = self.get_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        
+        with RequestProfiler(mode) as profiler:
+            response = self.get_response(request)
+        return profiler.save(request, response)
+    
+    async def __acall__(self, request):
+        mode = self.get_mode(request)
+        if mode is None:
+            return await self.get_response(request)
+        
+        # Thread de la boucle d'événements : les autres requêtes en cours
+        # pendant le profilage y apparaissent aussi
+        with RequestProfiler(mode) as profiler:
+            response = await self.get_response(request)
+        return profiler.save(request, response)
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import copy
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -49,7 +51,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'order_management.metrics.MetricsMiddleware',
+    'order_management.slow_queries.SlowQueryMiddleware',
+    'order_management.profiling.ProfilingMiddleware',
+    'order_management.memory.MemoryProfilingMiddleware',
+    'order_management.sites.SiteMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'order_management.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,12 +91,100 @@ WSGI_APPLICATION = 'order_management.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# La base est choisie par variables d'environnement :
+#   DB_ENGINE=sqlite (défaut) ou postgres
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+#   DB_CONN_MAX_AGE : durée de vie (s) des connexions persistantes PostgreSQL
+#   DB_POOL_MAX_SIZE : active le pool psycopg (désactive alors les connexions persistantes)
+#   DB_SQLITE_TIMEOUT : attente maximale (s) d'un verrou SQLite avant "database is locked"
+# Les tests utilisent le même moteur : `DB_ENGINE=postgres python manage.py test`
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'order_management'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Connexions réutilisées entre les requêtes, vérifiées avant réutilisation
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '0'))
+    if DB_POOL_MAX_SIZE:
+        # Le pool psycopg gère lui-même la réutilisation des connexions
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Attendre le verrou au lieu d'échouer immédiatement
+                'timeout': int(os.environ.get('DB_SQLITE_TIMEOUT', '20')),
+                # Prendre le verrou d'écriture dès le début des transactions pour
+                # éviter les échecs lors du passage lecture -> écriture
+                'transaction_mode': 'IMMEDIATE',
+                # WAL : les lectures ne sont plus bloquées par les écritures
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
+    }
+
+# Réplique en lecture pour les vues de reporting (voir order_management/db_routers.py) :
+#   DB_REPLICA_NAME : base (ou fichier SQLite) de la réplique
+#   DB_REPLICA_HOST, DB_REPLICA_PORT, DB_REPLICA_USER, DB_REPLICA_PASSWORD : PostgreSQL,
+#   les valeurs de `default` étant reprises pour celles qui ne sont pas renseignées
+# Pour essayer en local avec SQLite : DB_REPLICA_NAME=db-replica.sqlite3, puis
+# `python manage.py copy_to_replica` pour mettre la réplique à jour
+REPLICA_DATABASE = None
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    REPLICA_DATABASE = 'replica'
+    DATABASES[REPLICA_DATABASE] = copy.deepcopy(DATABASES['default'])
+    for key in ('NAME', 'HOST', 'PORT', 'USER', 'PASSWORD'):
+        value = os.environ.get(f'DB_REPLICA_{key}')
+        if value:
+            DATABASES[REPLICA_DATABASE][key] = value
+    # Les tests n'ont pas de réplique : lectures sur la base de test de `default`
+    DATABASES[REPLICA_DATABASE]['TEST'] = {'MIRROR': 'default'}
+
+# Sites (entrepôts), voir order_management/sites.py :
+#   DEFAULT_SITE : site des utilisateurs et commandes créés hors d'une requête
+#   SITE_DATABASES=lyon,paris : ces sites ont leur propre base (alias `site_lyon`...),
+#   configurée par DB_SITE_LYON_NAME, DB_SITE_LYON_HOST, DB_SITE_LYON_PORT,
+#   DB_SITE_LYON_USER, DB_SITE_LYON_PASSWORD (valeurs de `default` sinon) ;
+#   chaque base est créée par `python manage.py migrate --database site_lyon`
+DEFAULT_SITE = os.environ.get('DEFAULT_SITE', 'default')
+SITE_DATABASES = {}
+for site in filter(None, os.environ.get('SITE_DATABASES', '').split(',')):
+    alias = SITE_DATABASES[site] = f'site_{site}'
+    DATABASES[alias] = copy.deepcopy(DATABASES['default'])
+    for key in ('NAME', 'HOST', 'PORT', 'USER', 'PASSWORD'):
+        value = os.environ.get(f'DB_SITE_{site.upper()}_{key}')
+        if value:
+            DATABASES[alias][key] = value
+
+# Le routage par site passe avant la réplique : un site ayant sa base n'utilise pas la réplique
+DATABASE_ROUTERS = [
+    'order_management.sites.SiteRouter',
+    'order_management.db_routers.ReplicaRouter',
+]
+
+# Durée (en secondes) pendant laquelle un utilisateur qui vient de faire avancer
+# une commande lit `default` plutôt que la réplique (retard de réplication)
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '10'))
 
 
 # Password validation
@@ -138,19 +234,38 @@ AUTH_USER_MODEL = 'authentication.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': (
+        'order_management.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Le paramètre ?format= sert au format des listes de commandes (compact, columnar)
+    'URL_FORMAT_OVERRIDE': None,
 }
 
+# Compression des réponses (gzip, ou brotli si le module est installé)
+# à partir de cette taille en octets
+RESPONSE_COMPRESSION_MIN_BYTES = 1024
+RESPONSE_BROTLI_QUALITY = 5
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+# Durée (en secondes) de conservation des utilisateurs authentifiés dans le cache du processus
+AUTH_USER_CACHE_TTL = 30
+
+# Pool de threads dédié au hachage des mots de passe lors des connexions
+LOGIN_HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', '4'))
+# Attente maximale (en secondes) d'une connexion dans le pool avant de répondre 429
+LOGIN_HASH_TIMEOUT = 10
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -160,3 +275,50 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True  # For development only, restrict in production
+
+# Archivage des commandes emballées (voir `python manage.py archive_orders`)
+ORDER_ARCHIVE_AFTER_DAYS = 90
+
+# Durée (en secondes) d'une réservation de commande par un agent avant expiration
+ORDER_CLAIM_LEASE_SECONDS = 300
+
+# Durée de conservation des réponses associées aux en-têtes Idempotency-Key
+# (voir `python manage.py purge_idempotency_keys`)
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+
+# API PrestaShop (commandes du jour, import des commandes) ; la clé n'est lue
+# que dans l'environnement
+PRESTASHOP_API_URL = os.environ.get('PRESTASHOP_API_URL', 'http://192.168.1.114/presta16/api')
+PRESTASHOP_API_KEY = os.environ.get('PRESTASHOP_API_KEY', '')
+
+# Vues en lecture asynchrones (listes des modules, tableau de bord, PrestaShop),
+# à servir par un serveur ASGI : `uvicorn order_management.asgi:application`
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', '1') == '1'
+
+# Endpoint /metrics (Prometheus) : jeton attendu dans l'en-tête
+# `Authorization: Bearer <jeton>` (accès libre si vide)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Intervalle minimal (en secondes) entre deux recomptages en base des files d'attente
+METRICS_QUEUE_RESEED_SECONDS = int(os.environ.get('METRICS_QUEUE_RESEED_SECONDS', '60'))
+
+# Journal des requêtes SQL lentes, avec leur plan d'exécution
+# (GET /api/orders/diagnostics/slow-queries/, managers uniquement)
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', '0') == '1'
+SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200'))
+# Nombre de requêtes lentes conservées en mémoire
+SLOW_QUERY_BUFFER_SIZE = 100
+
+# Profilage à la demande : requêtes portant un jeton `X-Profile` valide
+# (POST /api/orders/diagnostics/profile-token/, managers uniquement)
+PROFILE_OUTPUT_DIR = os.environ.get('PROFILE_OUTPUT_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_TOKEN_MAX_AGE = 3600
+# Échantillonnage d'une requête sur N (0 pour désactiver)
+PROFILE_SAMPLE_RATE = int(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SAMPLING_INTERVAL_MS = 5
+# Nombre maximal de profils conservés dans PROFILE_OUTPUT_DIR (les plus anciens sont supprimés)
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '200'))
+
+# Mesure de la mémoire allouée (tracemalloc) par les requêtes de ces routes,
+# par nom d'URL, par exemple MEMORY_PROFILE_ROUTES=order-list-create,presta-orders
+MEMORY_PROFILE_ROUTES = [name for name in os.environ.get('MEMORY_PROFILE_ROUTES', '').split(',') if name]
+MEMORY_PROFILE_TOP_LINES = 10
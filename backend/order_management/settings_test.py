@@ -0,0 +1,24 @@
+"""
+Réglages des tests du routage des bases :
+
+    python manage.py test --settings=order_management.settings_test
+
+Ajoute aux réglages habituels une réplique (`replica`) et une base de site
+(`site_test`) qui sont de vraies bases de test, distinctes et vides. Le
+routage reste désactivé : seuls les tests qui l'activent (override_settings
+de REPLICA_DATABASE ou de SITE_DATABASES) les utilisent. Avec les réglages
+habituels, ces tests sont ignorés.
+"""
+import copy
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, DB_ENGINE
+
+REPLICA_DATABASE = None
+SITE_DATABASES = {}
+
+for alias in ('replica', 'site_test'):
+    DATABASES[alias] = copy.deepcopy(DATABASES['default'])
+    DATABASES[alias].pop('TEST', None)
+    if DB_ENGINE == 'postgres':
+        DATABASES[alias]['TEST'] = {'NAME': f"test_{DATABASES['default']['NAME']}_{alias}"}
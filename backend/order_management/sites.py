@@ -0,0 +1,168 @@
+"""
+Sites (entrepôts) : chaque utilisateur et chaque commande appartient à un site.
+
+Le site de l'utilisateur authentifié par JWT devient le site courant de la
+requête ; les managers `objects` des commandes et des utilisateurs ne
+renvoient alors que les lignes de ce site, et les commandes créées lui sont
+rattachées. Sans site courant (commandes de gestion, admin Django, /metrics),
+rien n'est filtré ; `all_sites` ignore toujours le site courant.
+
+Avec SITE_DATABASES, les données des commandes d'un site sont enregistrées
+dans sa propre base (voir SiteRouter). Les utilisateurs restent dans la base
+`default`, qui sert d'annuaire pour la connexion (l'authentification ne lit
+que `default`), et sont recopiés dans la base de leur site, où les commandes
+les référencent ; modifications et suppressions suivent par signal.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models
+
+# Applications dont toutes les données sont réparties par site
+SITE_APPS = ('orders',)
+
+_current_site = ContextVar('current_site', default=None)
+
+
+def get_current_site():
+    return _current_site.get()
+
+
+def set_current_site(site):
+    _current_site.set(site)
+
+
+@contextmanager
+def use_site(site):
+    """Exécute un bloc (commande de gestion, tâche) dans le contexte d'un site"""
+    token = _current_site.set(site)
+    try:
+        yield
+    finally:
+        _current_site.reset(token)
+
+
+def default_site():
+    """Site des lignes créées : le site courant, sinon DEFAULT_SITE"""
+    return get_current_site() or settings.DEFAULT_SITE
+
+
+def site_database(site=None):
+    """Alias de la base du site (du site courant par défaut)"""
+    return settings.SITE_DATABASES.get(site or get_current_site(), DEFAULT_DB_ALIAS)
+
+
+def sites_by_database():
+    """
+    Sites à parcourir pour qu'une commande de gestion traite toutes les bases :
+    None (tous les sites de `default`), puis chaque site de SITE_DATABASES.
+    """
+    return [None, *settings.SITE_DATABASES]
+
+
+class SiteManagerMixin:
+    """Restreint les requêtes au site courant, s'il y en a un"""
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        site = get_current_site()
+        if site is not None:
+            queryset = queryset.filter(site=site)
+        return queryset
+
+
+class SiteManager(SiteManagerMixin, models.Manager):
+    pass
+
+
+class SiteRouter:
+    """
+    Envoie les données des commandes du site courant vers sa base
+    (SITE_DATABASES). Les sites sans base propre partagent `default`.
+    """
+    
+    def uses_site_database(self, model):
+        return model._meta.app_label in SITE_APPS
+    
+    def db_for_read(self, model, **hints):
+        database = settings.SITE_DATABASES.get(get_current_site())
+        # Les utilisateurs du site sont lus dans sa base, pour les jointures avec les commandes
+        if database and (self.uses_site_database(model) or model._meta.label == settings.AUTH_USER_MODEL):
+            return database
+        return None
+    
+    def db_for_write(self, model, **hints):
+        if not settings.SITE_DATABASES:
+            return None
+        if model._meta.label == settings.AUTH_USER_MODEL:
+            # Annuaire commun : les copies dans les bases des sites suivent par signal
+            return DEFAULT_DB_ALIAS
+        if self.uses_site_database(model):
+            return settings.SITE_DATABASES.get(get_current_site())
+        return None
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        if not settings.SITE_DATABASES:
+            return None
+        # Un utilisateur de `default` et sa copie dans la base du site ont la même clé
+        databases = {DEFAULT_DB_ALIAS, *settings.SITE_DATABASES.values()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def copy_user_to_site_database(sender, instance, using, raw=False, **kwargs):
+    """
+    Recopie un utilisateur enregistré dans `default` vers la base de son site
+    (post_save) : mot de passe, rôle et statut suivent à chaque enregistrement.
+    Les copies laissées dans les bases d'un ancien site sont désactivées (et non
+    supprimées : les commandes de ce site les référencent toujours).
+    """
+    if raw or using != DEFAULT_DB_ALIAS:
+        return
+    database = settings.SITE_DATABASES.get(instance.site)
+    if database:
+        sender.all_sites.using(database).update_or_create(pk=instance.pk, defaults={
+            field.attname: getattr(instance, field.attname)
+            for field in sender._meta.concrete_fields if not field.primary_key
+        })
+    for other_database in settings.SITE_DATABASES.values():
+        if other_database != database:
+            sender.all_sites.using(other_database).filter(pk=instance.pk, is_active=True).update(is_active=False)
+
+
+def delete_user_from_site_databases(sender, instance, using, **kwargs):
+    """Supprime les copies d'un utilisateur supprimé de `default` (post_delete)"""
+    if using != DEFAULT_DB_ALIAS:
+        return
+    for database in settings.SITE_DATABASES.values():
+        sender.all_sites.using(database).filter(pk=instance.pk).delete()
+
+
+class SiteMiddleware:
+    """Le site courant ne survit pas à la requête (threads réutilisés sous WSGI)"""
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        set_current_site(None)
+        try:
+            return self.get_response(request)
+        finally:
+            set_current_site(None)
+    
+    async def __acall__(self, request):
+        set_current_site(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            set_current_site(None)
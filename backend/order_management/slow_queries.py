@@ -0,0 +1,141 @@
+"""
+Journal des requêtes SQL lentes (activé par SLOW_QUERY_LOG).
+
+Toute requête dépassant SLOW_QUERY_THRESHOLD_MS est journalisée avec la vue
+et la ligne de code qui l'ont déclenchée, ainsi que son plan d'exécution
+(EXPLAIN QUERY PLAN sur SQLite, EXPLAIN sur PostgreSQL). Les
+SLOW_QUERY_BUFFER_SIZE dernières sont conservées en mémoire et consultables
+par les managers (GET /api/orders/diagnostics/slow-queries/).
+"""
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import ExitStack, nullcontext
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES = deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+
+# Préfixe de la commande donnant le plan d'exécution, selon la base
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+_state = threading.local()
+
+
+def explain(connection, sql, params):
+    """Plan d'exécution d'une requête SELECT (None si indisponible)"""
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+    if not prefix or not re.match(r'\s*(SELECT|WITH)\b', sql, re.IGNORECASE):
+        return None
+    
+    # La requête EXPLAIN passe elle aussi par le wrapper : on ne la mesure pas.
+    # Dans une transaction, un point de sauvegarde évite qu'un échec ne l'interrompe.
+    _state.explaining = True
+    savepoint = transaction.atomic(using=connection.alias) if connection.in_atomic_block else nullcontext()
+    try:
+        with savepoint, connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except Exception as e:
+        return f"EXPLAIN impossible : {e}"
+    finally:
+        _state.explaining = False
+    
+    # SQLite : (id, parent, notused, detail) ; PostgreSQL : une colonne par ligne
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+def uses_table_scan(plan, table):
+    """Vrai si le plan parcourt toute la table au lieu d'utiliser un index"""
+    for line in (plan or '').splitlines():
+        if re.search(rf'\bSeq Scan on {table}\b', line):
+            return True
+        if re.search(rf'\bSCAN {table}\b', line) and 'INDEX' not in line:
+            return True
+    return False
+
+
+def calling_frame():
+    """
+    Dernier appel du code des applications dans la pile (fichier:ligne).
+    Les middlewares du projet sont ignorés ; pour les vues asynchrones, la
+    requête s'exécute dans un autre thread et aucune ligne n'est trouvée.
+    """
+    base_dir = str(settings.BASE_DIR)
+    project_dir = os.path.dirname(__file__)
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename \
+                and not frame.filename.startswith(project_dir):
+            return f"{frame.filename[len(base_dir) + 1:]}:{frame.lineno} in {frame.name}"
+    return None
+
+
+class SlowQueryLogger:
+    """Wrapper d'exécution (connection.execute_wrapper) lié à une requête HTTP"""
+    
+    def __init__(self, request):
+        self.request = request
+    
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else None
+    
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_state, 'explaining', False):
+            return execute(sql, params, many, context)
+        
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+            self.record(context['connection'], sql, params, many, duration_ms)
+        return result
+    
+    def record(self, connection, sql, params, many, duration_ms):
+        plan = None if many else explain(connection, sql, params)
+        entry = {
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.alias,
+            'duration_ms': round(duration_ms, 1),
+            'method': self.request.method,
+            'path': self.request.path,
+            'view': self.view_name(),
+            'frame': calling_frame(),
+            'sql': sql,
+            'params': repr(params)[:500],
+            'plan': plan,
+        }
+        SLOW_QUERIES.append(entry)
+        logger.warning(
+            "Requête lente (%.0f ms) dans %s, %s : %s\n%s",
+            duration_ms, entry['view'], entry['frame'], sql, plan or ''
+        )
+
+
+class SlowQueryMiddleware:
+    """Installe le wrapper sur toutes les connexions le temps de la requête"""
+    
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        wrapper = SlowQueryLogger(request)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(wrapper))
+            return self.get_response(request)
@@ -0,0 +1,300 @@
+import copy
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from authentication.authentication import CachedJWTAuthentication, UserRefreshToken
+from authentication.models import User
+from orders.models import Order
+from .db_routers import has_recent_write
+from .profiling import ProfilingMiddleware
+from .sites import SiteRouter, use_site
+
+
+def separate_test_database(alias):
+    """Base de test distincte de `default`, déclarée par order_management/settings_test.py"""
+    return alias in settings.DATABASES and settings.DATABASES[alias].get('TEST', {}).get('MIRROR') is None
+
+
+TEST_SETTINGS_ONLY = "--settings=order_management.settings_test uniquement"
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "SQLite uniquement (DB_ENGINE=sqlite)")
+class SQLiteConfigurationTests(SimpleTestCase):
+    """
+    Options SQLite de settings.py, vérifiées sur un fichier temporaire : la base
+    de test SQLite est en mémoire et n'a ni journal WAL ni attente de verrou.
+    """
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_dict = copy.deepcopy(connection.settings_dict)
+        self.settings_dict['NAME'] = os.path.join(directory.name, 'db.sqlite3')
+        
+        self.wrapper = self.connect()
+        with self.wrapper.cursor() as cursor:
+            cursor.execute("CREATE TABLE scans (id INTEGER PRIMARY KEY)")
+    
+    def connect(self):
+        """Nouvelle connexion au fichier temporaire (fermée à la fin du test, depuis le thread principal)"""
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        wrapper = DatabaseWrapper(copy.deepcopy(self.settings_dict), alias='sqlite_file')
+        wrapper.inc_thread_sharing()
+        self.addCleanup(wrapper.close)
+        return wrapper
+    
+    def test_wal_and_busy_timeout(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.DATABASES['default']['OPTIONS']['timeout'] * 1000)
+        self.assertEqual(self.wrapper.transaction_mode, 'IMMEDIATE')
+    
+    def test_concurrent_write_waits_for_lock(self):
+        """Une écriture concurrente attend la fin de la transaction au lieu d'échouer"""
+        lock_taken = threading.Event()
+        
+        def hold_write_lock():
+            writer = self.connect()
+            with writer.cursor() as cursor:
+                writer.set_autocommit(False)
+                cursor.execute("INSERT INTO scans DEFAULT VALUES")
+                lock_taken.set()
+                time.sleep(0.3)
+                writer.commit()
+        
+        thread = threading.Thread(target=hold_write_lock)
+        thread.start()
+        self.assertTrue(lock_taken.wait(5))
+        other = self.wrapper
+        with other.cursor() as cursor:
+            # Lecture pendant l'écriture (WAL), puis écriture après l'attente du verrou
+            cursor.execute("SELECT count(*) FROM scans")
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute("INSERT INTO scans DEFAULT VALUES")
+        thread.join()
+        with other.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM scans")
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "PostgreSQL uniquement (DB_ENGINE=postgres)")
+class PostgreSQLConfigurationTests(SimpleTestCase):
+    def test_persistent_or_pooled_connections(self):
+        database = settings.DATABASES['default']
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        if 'pool' in database['OPTIONS']:
+            self.assertEqual(database['CONN_MAX_AGE'], 0)
+        else:
+            self.assertEqual(database['CONN_MAX_AGE'], int(os.environ.get('DB_CONN_MAX_AGE', '60')))
+
+
+class ProfilingDirectoryTests(SimpleTestCase):
+    """Le dossier des profils est borné à PROFILE_MAX_FILES fichiers"""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.old_files = [f'20200101-00000{index}-000000-orders-list-abcdef.prof' for index in range(3)]
+        for name in (*self.old_files, 'notes.txt'):
+            open(os.path.join(self.directory, name), 'w').close()
+    
+    def test_oldest_profiles_removed(self):
+        middleware = ProfilingMiddleware(lambda request: HttpResponse('ok'))
+        with override_settings(PROFILE_OUTPUT_DIR=self.directory, PROFILE_SAMPLE_RATE=1, PROFILE_MAX_FILES=3):
+            written = [middleware(RequestFactory().get('/api/orders/'))['X-Profile-File'] for _ in range(2)]
+        
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            sorted([self.old_files[2], *written, 'notes.txt'])
+        )
+    
+    def test_async_requests_profiled_without_thread_switch(self):
+        async def get_response(request):
+            return HttpResponse('ok')
+        
+        middleware = ProfilingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with override_settings(PROFILE_OUTPUT_DIR=self.directory, PROFILE_SAMPLE_RATE=0):
+            response = async_to_sync(middleware)(RequestFactory().get('/api/orders/'))
+            self.assertNotIn('X-Profile-File', response)
+        with override_settings(PROFILE_OUTPUT_DIR=self.directory, PROFILE_SAMPLE_RATE=1, PROFILE_MAX_FILES=10):
+            response = async_to_sync(middleware)(RequestFactory().get('/api/orders/'))
+        self.assertTrue(os.path.isfile(os.path.join(self.directory, response['X-Profile-File'])))
+
+
+@unittest.skipUnless(separate_test_database('replica'), TEST_SETTINGS_ONLY)
+@override_settings(REPLICA_DATABASE='replica', REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(TestCase):
+    """
+    La réplique de test est une base distincte de `default` : une commande
+    n'existant que dans l'une des deux montre quelle base a été lue.
+    """
+    # Même ignorée, la classe ne doit pas réclamer une base non déclarée
+    databases = {'default', 'replica'} if separate_test_database('replica') else {'default'}
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='p', role='MANAGER')
+        cls.agent = User.objects.create_user('agent', password='p', role='AGENT')
+        for user in (cls.manager, cls.agent):
+            User.objects.using('replica').create(
+                pk=user.pk, username=user.username, password=user.password, role=user.role
+            )
+        Order.objects.create(reference='DEFAULT-1', cart_number='C-1', creator=cls.agent)
+        Order.objects.using('replica').create(reference='REPLICA-1', cart_number='C-1', creator_id=cls.agent.pk)
+    
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+    
+    def client_for(self, user):
+        client = APIClient(HTTP_HOST='localhost')
+        client.force_authenticate(user)
+        return client
+    
+    def list_references(self, user):
+        response = self.client_for(user).get('/api/orders/', {'date': 'all'})
+        self.assertEqual(response.status_code, 200)
+        return [order['reference'] for order in response.json()]
+    
+    def test_reporting_read_uses_replica(self):
+        self.assertEqual(self.list_references(self.manager), ['REPLICA-1'])
+    
+    def test_write_goes_to_default(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.agent).post('/api/orders/', {'reference': 'NEW-1', 'cart_number': 'C-2'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Order.objects.using('default').filter(reference='NEW-1').exists())
+        self.assertFalse(Order.objects.using('replica').filter(reference='NEW-1').exists())
+    
+    def test_reads_stick_to_default_after_write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_for(self.agent).post('/api/orders/', {'reference': 'NEW-1', 'cart_number': 'C-2'})
+        
+        # L'auteur relit ses écritures sur `default`, les autres lisent toujours la réplique
+        self.assertEqual(sorted(self.list_references(self.agent)), ['DEFAULT-1', 'NEW-1'])
+        self.assertEqual(self.list_references(self.manager), ['REPLICA-1'])
+        
+        # Marqueur expiré : retour sur la réplique
+        cache.clear()
+        self.assertEqual(self.list_references(self.agent), ['REPLICA-1'])
+    
+    def test_every_order_write_sets_sticky_reads(self):
+        order = Order.objects.get(reference='DEFAULT-1')
+        writes = {
+            'modification sans changement de statut': lambda client: client.put(
+                f'/api/orders/{order.pk}/', {'cart_number': 'C-9', 'version': order.version}, format='json'
+            ),
+            'réservation': lambda client: client.post('/api/orders/preparation/claim/'),
+            'libération': lambda client: client.post(f'/api/orders/{order.pk}/release/'),
+            'suppression': lambda client: client.delete(f'/api/orders/{order.pk}/'),
+        }
+        for name, write in writes.items():
+            with self.subTest(name):
+                cache.clear()
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = write(self.client_for(self.agent))
+                self.assertLess(response.status_code, 300)
+                self.assertTrue(has_recent_write(self.agent))
+                if Order.objects.filter(pk=order.pk).exists():
+                    order.refresh_from_db()
+
+
+@unittest.skipUnless(separate_test_database('site_test'), TEST_SETTINGS_ONLY)
+@override_settings(SITE_DATABASES={'lyon': 'site_test'})
+class SiteDatabaseTests(TestCase):
+    """Site `lyon` dans sa propre base (`site_test`), les autres sites dans `default`"""
+    # Même ignorée, la classe ne doit pas réclamer une base non déclarée
+    databases = {'default', 'site_test'} if separate_test_database('site_test') else {'default'}
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.lyon_agent = User.objects.create_user('lyon', password='p', role='AGENT', site='lyon')
+        cls.other_agent = User.objects.create_user('paris', password='p', role='AGENT', site='paris')
+    
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+    
+    def jwt_client(self, user):
+        # Authentification JWT (et non force_authenticate) : c'est elle qui fixe le site courant
+        client = APIClient(HTTP_HOST='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(user).access_token}')
+        return client
+    
+    def site_copy(self, user):
+        return User.all_sites.using('site_test').get(pk=user.pk)
+    
+    def test_router(self):
+        router = SiteRouter()
+        with use_site('lyon'):
+            self.assertEqual(router.db_for_read(Order), 'site_test')
+            self.assertEqual(router.db_for_write(Order), 'site_test')
+            self.assertEqual(router.db_for_read(User), 'site_test')
+            self.assertEqual(router.db_for_write(User), 'default')
+        with use_site('paris'):
+            self.assertIsNone(router.db_for_read(Order))
+            self.assertIsNone(router.db_for_write(Order))
+    
+    def test_orders_isolated_by_site(self):
+        response = self.jwt_client(self.lyon_agent).post('/api/orders/', {'reference': 'LYON-1', 'cart_number': 'C-1'})
+        self.assertEqual(response.status_code, 201)
+        response = self.jwt_client(self.other_agent).post('/api/orders/', {'reference': 'PARIS-1', 'cart_number': 'C-1'})
+        self.assertEqual(response.status_code, 201)
+        
+        self.assertEqual(list(Order.all_sites.using('site_test').values_list('reference', flat=True)), ['LYON-1'])
+        self.assertEqual(list(Order.all_sites.using('default').values_list('reference', flat=True)), ['PARIS-1'])
+        
+        response = self.jwt_client(self.lyon_agent).get('/api/orders/', {'date': 'all'})
+        self.assertEqual([order['reference'] for order in response.json()], ['LYON-1'])
+        response = self.jwt_client(self.other_agent).get('/api/orders/', {'date': 'all'})
+        self.assertEqual([order['reference'] for order in response.json()], ['PARIS-1'])
+    
+    def test_user_changes_copied_to_site_database(self):
+        self.assertTrue(self.site_copy(self.lyon_agent).check_password('p'))
+        self.assertFalse(User.all_sites.using('site_test').filter(pk=self.other_agent.pk).exists())
+        
+        self.lyon_agent.set_password('nouveau')
+        self.lyon_agent.role = 'MANAGER'
+        self.lyon_agent.is_active = False
+        self.lyon_agent.save()
+        copy = self.site_copy(self.lyon_agent)
+        self.assertTrue(copy.check_password('nouveau'))
+        self.assertEqual(copy.role, 'MANAGER')
+        self.assertFalse(copy.is_active)
+    
+    def test_user_moved_to_other_site_deactivated(self):
+        self.lyon_agent.site = 'paris'
+        self.lyon_agent.save()
+        self.assertFalse(self.site_copy(self.lyon_agent).is_active)
+        self.assertTrue(User.all_sites.using('default').get(pk=self.lyon_agent.pk).is_active)
+    
+    def test_user_deletion_copied_to_site_database(self):
+        with use_site('lyon'):
+            Order.objects.create(reference='LYON-1', cart_number='C-1', creator=self.lyon_agent)
+        self.lyon_agent.delete()
+        self.assertFalse(User.all_sites.using('site_test').filter(pk=self.lyon_agent.pk).exists())
+        self.assertFalse(Order.all_sites.using('site_test').exists())
+    
+    def test_authentication_reads_default(self):
+        token = UserRefreshToken.for_user(self.lyon_agent).access_token
+        # Copie du site restée active : seul l'annuaire `default` fait foi
+        User.all_sites.using('default').filter(pk=self.lyon_agent.pk).update(is_active=False)
+        with use_site('lyon'):
+            with self.assertRaises(AuthenticationFailed):
+                CachedJWTAuthentication().get_user(token)
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from order_management.sites import site_database
+
+from .models import Order, ArchivedOrder
+
+# Champs copiés tels quels de la table active vers la table d'archive
+ARCHIVED_FIELDS = (
+    'id', 'reference', 'status', 'cart_number', 'line_count',
+    'creator_id', 'preparer_id', 'controller_id', 'packer_id',
+    'created_at', 'prepared_at', 'controlled_at', 'packed_at', 'completed_at',
+    'version', 'site',
+)
+
+
+def archive_cutoff(days=None):
+    """Date limite avant laquelle une commande emballée est archivable"""
+    if days is None:
+        days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_may_contain(start_datetime):
+    """
+    Indique si l'archive peut contenir des commandes créées après `start_datetime`.
+    
+    Une commande n'est archivée que lorsqu'elle a été emballée avant la date
+    limite, donc sa date de création est forcément antérieure : les requêtes
+    portant sur une période récente n'ont pas besoin d'interroger l'archive.
+    """
+    return start_datetime is None or start_datetime < archive_cutoff()
+
+
+def archive_orders(days=None, batch_size=1000, dry_run=False):
+    """
+    Déplace les commandes emballées depuis plus de `days` jours vers ArchivedOrder.
+    
+    Chaque lot est copié puis supprimé de la table active dans une même
+    transaction. Le site est copié avec la référence : une référence reste
+    unique dans son site, commandes actives et archivées confondues (la
+    création et l'import vérifient les deux tables). Retourne le nombre de
+    commandes archivées.
+    """
+    candidates = Order.objects.filter(status='PACKED', packed_at__lt=archive_cutoff(days))
+    if dry_run:
+        return candidates.count()
+    
+    archived_count = 0
+    while True:
+        with transaction.atomic(using=site_database()):
+            rows = list(candidates.order_by('id').values(*ARCHIVED_FIELDS)[:batch_size])
+            if not rows:
+                break
+            ArchivedOrder.objects.bulk_create([ArchivedOrder(**row) for row in rows])
+            Order.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        archived_count += len(rows)
+    
+    return archived_count
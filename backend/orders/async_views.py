@@ -0,0 +1,268 @@
+"""
+Versions asynchrones des vues en lecture les plus sollicitées (listes des
+modules, tableau de bord, recherche par référence, commandes PrestaShop).
+
+Servies par un serveur ASGI (`uvicorn order_management.asgi:application`),
+elles libèrent le worker pendant les requêtes SQL et les appels à l'API
+PrestaShop : un même processus peut alors tenir beaucoup plus de connexions
+simultanées (postes qui rafraîchissent leur liste, tableaux de bord ouverts).
+Le paramètre ASYNC_READ_VIEWS permet de revenir aux vues synchrones.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from adrf.views import APIView
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework import status, permissions
+from rest_framework.response import Response
+from .models import Order, ArchivedOrder
+from .archive import archive_may_contain
+from .serializers import OrderSerializer, COMPACT_FORMATS, order_user_ids, compact_order_payload
+from .presta_views import fetch_presta_orders, filter_today_orders, fetch_customer_name, format_presta_order
+from authentication.models import User
+from order_management.db_routers import ReplicaReadMixin
+
+# Relations sérialisées par OrderSerializer : elles doivent être chargées
+# d'avance, aucun accès paresseux à la base n'étant permis en contexte async
+ORDER_RELATIONS = ('creator', 'preparer', 'controller', 'packer')
+
+# Nombre maximal d'appels simultanés à l'API PrestaShop pour les clients
+PRESTA_CONCURRENCY = 8
+
+
+def day_range(date_param):
+    """Journée demandée ('today' ou YYYY-MM-DD), comme dans les vues synchrones"""
+    today = timezone.now().date()
+    start_date = today
+    
+    if date_param != 'today':
+        try:
+            # Format attendu: YYYY-MM-DD
+            start_date = timezone.datetime.strptime(date_param, '%Y-%m-%d').date()
+        except ValueError:
+            # En cas d'erreur de format, utiliser la date d'aujourd'hui
+            pass
+    end_date = start_date + timedelta(days=1)
+    
+    start_datetime = timezone.make_aware(timezone.datetime.combine(start_date, timezone.datetime.min.time()))
+    end_datetime = timezone.make_aware(timezone.datetime.combine(end_date, timezone.datetime.min.time()))
+    return start_datetime, end_datetime
+
+
+async def serialize_orders(queryset, payload_format=None):
+    """Équivalent asynchrone de serialize_order_list"""
+    if payload_format in COMPACT_FORMATS:
+        orders = [order async for order in queryset]
+        users = [user async for user in User.objects.filter(id__in=order_user_ids(orders))]
+        return compact_order_payload(orders, users, payload_format)
+    
+    orders = [order async for order in queryset.select_related(*ORDER_RELATIONS)]
+    return OrderSerializer(orders, many=True).data
+
+
+class AsyncStageListView(APIView):
+    """
+    Liste des commandes du jour en attente d'une étape.
+    Seules les requêtes GET sont asynchrones : les validations (POST) restent
+    traitées par les vues synchrones de views.py.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    # Statut des commandes en attente de l'étape
+    waiting_status = None
+    
+    def get_queryset(self, request, start_datetime, end_datetime):
+        return Order.objects.filter(
+            status=self.waiting_status,
+            created_at__gte=start_datetime,
+            created_at__lt=end_datetime
+        ).order_by('-created_at')
+    
+    async def get(self, request):
+        start_datetime, end_datetime = day_range(request.query_params.get('date', 'today'))
+        orders = self.get_queryset(request, start_datetime, end_datetime)
+        return Response(await serialize_orders(orders, request.query_params.get('format')))
+
+
+class AsyncPreparationListView(AsyncStageListView):
+    waiting_status = 'CREATED'
+    
+    def get_queryset(self, request, start_datetime, end_datetime):
+        orders = super().get_queryset(request, start_datetime, end_datetime)
+        creator_only = request.query_params.get('creator_only', 'false').lower() == 'true'
+        
+        # Agent ou manager avec creator_only=true ne voit que ses propres commandes
+        if not request.user.is_manager() or creator_only:
+            orders = orders.filter(creator=request.user)
+        return orders
+
+
+class AsyncControlListView(AsyncStageListView):
+    waiting_status = 'PREPARED'
+
+
+class AsyncPackingListView(AsyncStageListView):
+    waiting_status = 'CONTROLLED'
+
+
+class AsyncOrderReferenceView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    async def get(self, request, reference):
+        try:
+            order = await Order.objects.select_related(*ORDER_RELATIONS).aget(reference=reference)
+        except Order.DoesNotExist:
+            return Response({"error": "Commande non trouvée"}, status=status.HTTP_404_NOT_FOUND)
+        
+        # Check if user has permission to view this order
+        if not request.user.is_manager() and request.user.id != order.creator_id:
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        
+        return Response(OrderSerializer(order).data)
+
+
+class AsyncDashboardView(ReplicaReadMixin, APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    async def get(self, request):
+        # Only managers can access the dashboard
+        if not request.user.is_manager():
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        
+        start_datetime, end_datetime = day_range(request.query_params.get('date', 'today'))
+        
+        # Les journées anciennes comptent aussi les commandes archivées
+        models_to_query = [Order]
+        if archive_may_contain(start_datetime):
+            models_to_query.append(ArchivedOrder)
+        
+        # Get counts of orders by status for the specified date
+        counts = await asyncio.gather(*(
+            queryset.acount()
+            for model in models_to_query
+            for day_orders in [model.objects.filter(created_at__gte=start_datetime, created_at__lt=end_datetime)]
+            for queryset in (day_orders, day_orders.exclude(status='PACKED'), day_orders.filter(status='PACKED'))
+        ))
+        total_orders, in_progress_orders, completed_orders = (sum(counts[i::3]) for i in range(3))
+        
+        # Calculate average times for orders completed today
+        preparation_times, control_times, packing_times, total_times = [], [], [], []
+        for model in models_to_query:
+            async for order in model.objects.filter(
+                status='PACKED',
+                packed_at__gte=start_datetime,
+                packed_at__lt=end_datetime
+            ):
+                for times, value in (
+                    (preparation_times, order.preparation_time()),
+                    (control_times, order.control_time()),
+                    (packing_times, order.packing_time()),
+                    (total_times, order.total_time()),
+                ):
+                    if value is not None:
+                        times.append(value)
+        
+        def average(times):
+            return sum(times) / len(times) if times else 0
+        
+        # Get agent statistics
+        agent_stats = []
+        async for agent in User.objects.filter(role='AGENT'):
+            # Les compteurs portent sur tout l'historique, archive comprise
+            counts = await asyncio.gather(*(
+                model.objects.filter(**{field: agent}).acount()
+                for field in ('creator', 'preparer', 'controller', 'packer')
+                for model in (Order, ArchivedOrder)
+            ))
+            created_count, prepared_count, controlled_count, packed_count = (
+                counts[i] + counts[i + 1] for i in range(0, len(counts), 2)
+            )
+            
+            agent_stats.append({
+                'id': agent.id,
+                'username': agent.username,
+                'first_name': agent.first_name,
+                'last_name': agent.last_name,
+                'created_count': created_count,
+                'prepared_count': prepared_count,
+                'controlled_count': controlled_count,
+                'packed_count': packed_count,
+                'total_count': created_count + prepared_count + controlled_count + packed_count
+            })
+        
+        return Response({
+            'order_counts': {
+                'total': total_orders,
+                'in_progress': in_progress_orders,
+                'completed': completed_orders
+            },
+            'average_times': {
+                'preparation': average(preparation_times),
+                'control': average(control_times),
+                'packing': average(packing_times),
+                'total': average(total_times)
+            },
+            'agent_stats': agent_stats
+        })
+
+
+class AsyncPrestaOrdersView(ReplicaReadMixin, APIView):
+    """
+    Commandes PrestaShop du jour (managers uniquement).
+    Les noms des clients sont récupérés en parallèle et les commandes internes
+    correspondantes en une seule requête.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    async def get(self, request):
+        # Vérifier que l'utilisateur est un manager
+        if not request.user.is_manager():
+            return Response(
+                {"error": "Accès restreint aux managers"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            # Les appels HTTP bloquants sont exécutés hors de la boucle d'événements
+            status_code, orders_data = await sync_to_async(fetch_presta_orders, thread_sensitive=False)()
+            
+            if status_code != 200:
+                return Response(
+                    {"error": f"Erreur lors de la connexion à l'API PrestaShop: {status_code}"},
+                    status=status.HTTP_502_BAD_GATEWAY
+                )
+            
+            presta_orders = filter_today_orders(orders_data)
+            
+            # Un seul appel par client, PRESTA_CONCURRENCY au plus en même temps
+            semaphore = asyncio.Semaphore(PRESTA_CONCURRENCY)
+            
+            async def customer_name(id_customer):
+                async with semaphore:
+                    return await sync_to_async(fetch_customer_name, thread_sensitive=False)(id_customer)
+            
+            customer_ids = list({order.get('id_customer') for order in presta_orders})
+            names = await asyncio.gather(*(customer_name(id_customer) for id_customer in customer_ids))
+            customer_names = dict(zip(customer_ids, names))
+            
+            references = [order.get('reference') for order in presta_orders if order.get('reference')]
+            internal_orders = {
+                order.reference: order
+                async for order in Order.objects.filter(reference__in=references).select_related(*ORDER_RELATIONS)
+            }
+            
+            return Response([
+                format_presta_order(
+                    order,
+                    customer_names[order.get('id_customer')],
+                    internal_orders.get(order.get('reference'))
+                )
+                for order in presta_orders
+            ])
+        
+        except Exception as e:
+            return Response(
+                {"error": f"Erreur lors de la récupération des commandes PrestaShop: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
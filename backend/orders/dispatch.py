@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from order_management.sites import site_database
+
+from .models import Order
+from .transitions import STAGES
+
+# Politiques d'attribution : ordre de prise des commandes disponibles
+CLAIM_ORDERINGS = {
+    'age': ('created_at', 'id'),
+    'line_count': (F('line_count').asc(nulls_last=True), 'created_at', 'id'),
+    '-line_count': (F('line_count').desc(nulls_last=True), 'created_at', 'id'),
+}
+
+# Nombre de tentatives de réservation conditionnelle sans SKIP LOCKED
+MAX_CLAIM_ATTEMPTS = 5
+
+
+def claimable_orders(stage, user, now):
+    """Commandes en attente de `stage` sans réservation active d'un autre agent"""
+    return Order.objects.filter(status=STAGES[stage]['from_status']).filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lte=now) | Q(claimed_by=user)
+    )
+
+
+def claim_next_order(stage, user, policy='age'):
+    """
+    Réserve pour `user` la prochaine commande en attente de l'étape `stage`,
+    pour ORDER_CLAIM_LEASE_SECONDS secondes. Retourne None si aucune commande
+    n'est disponible.
+    
+    Avec PostgreSQL, les lignes déjà verrouillées par une autre réservation en
+    cours sont sautées (SELECT ... FOR UPDATE SKIP LOCKED). Sinon, la
+    réservation est une mise à jour conditionnelle sur la version, retentée
+    sur la commande suivante en cas de course.
+    """
+    now = timezone.now()
+    claimed_until = now + timedelta(seconds=settings.ORDER_CLAIM_LEASE_SECONDS)
+    
+    # Un agent qui a déjà une réservation active pour cette étape la retrouve
+    current = Order.objects.filter(
+        status=STAGES[stage]['from_status'], claimed_by=user, claimed_until__gt=now
+    ).order_by('claimed_until').first()
+    if current:
+        current.claimed_until = claimed_until
+        if current.save_if_unchanged(['claimed_until']):
+            return current
+    
+    candidates = claimable_orders(stage, user, now).order_by(*CLAIM_ORDERINGS[policy])
+    
+    # Fonctionnalités de la base qui porte les commandes du site, pas de `default`
+    database = site_database()
+    if connections[database].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=database):
+            order = candidates.select_for_update(skip_locked=True, of=('self',)).first()
+            if order is None:
+                return None
+            order.claimed_by = user
+            order.claimed_until = claimed_until
+            # La ligne est verrouillée : la mise à jour conditionnelle ne peut pas échouer
+            order.save_if_unchanged(['claimed_by', 'claimed_until'])
+            return order
+    
+    skipped_ids = []
+    for attempt in range(MAX_CLAIM_ATTEMPTS):
+        order = candidates.exclude(id__in=skipped_ids).first()
+        if order is None:
+            return None
+        order.claimed_by = user
+        order.claimed_until = claimed_until
+        if order.save_if_unchanged(['claimed_by', 'claimed_until']):
+            return order
+        # Réservée entre-temps par un autre agent : passer à la suivante
+        skipped_ids.append(order.id)
+    return None
+
+
+def release_order(order):
+    """Libère la réservation d'une commande. Retourne False en cas de conflit de version."""
+    order.claimed_by = None
+    order.claimed_until = None
+    return order.save_if_unchanged(['claimed_by', 'claimed_until'])
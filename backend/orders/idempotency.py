@@ -0,0 +1,119 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from order_management.sites import site_database
+
+from .models import IdempotencyKey
+
+# Une requête restée « en cours » plus longtemps est considérée comme abandonnée
+PENDING_TIMEOUT = timedelta(seconds=60)
+
+# Réponses non mémorisées : le client doit pouvoir réessayer réellement
+RETRYABLE_STATUS_CODES = (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+def request_fingerprint(request):
+    """Empreinte du corps de la requête (JSON ou formulaire, fichiers par leur nom)"""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {name: values for name, values in data.lists()}
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class KeyClaimFailed(Exception):
+    """La clé n'a pu être ni réservée ni relue (supprimée entre-temps par une autre requête)"""
+
+
+def _claim_key(user, key, method, path, request_hash):
+    """
+    Enregistre la clé comme « en cours ». Retourne (enregistrement, créé) ;
+    si la clé existe déjà, retourne l'enregistrement existant. Lève
+    KeyClaimFailed si aucune des deux tentatives n'aboutit.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic(using=site_database()):
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, method=method, path=path, request_hash=request_hash
+                ), True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if record is None:
+                continue
+            
+            now = timezone.now()
+            expired = record.created_at < now - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+            abandoned = record.status_code is None and record.created_at < now - PENDING_TIMEOUT
+            if not (expired or abandoned):
+                return record, False
+            # Clé expirée ou requête abandonnée : la libérer puis réessayer
+            IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+    raise KeyClaimFailed()
+
+
+def idempotent(view_method):
+    """
+    Décorateur des méthodes POST de vues APIView : si la requête porte un
+    en-tête `Idempotency-Key` déjà reçu de cet utilisateur, la réponse
+    mémorisée est renvoyée sans réexécuter la vue.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        
+        if len(key) > 255:
+            return Response({"error": "Clé d'idempotence trop longue (255 caractères maximum)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        request_hash = request_fingerprint(request)
+        try:
+            record, created = _claim_key(request.user, key, request.method, request.path, request_hash)
+        except KeyClaimFailed:
+            return Response({"error": "Clé d'idempotence en cours de modification, veuillez réessayer"},
+                            status=status.HTTP_409_CONFLICT)
+        if not created:
+            # Les clés enregistrées avant l'ajout de l'empreinte n'en ont pas
+            if record.method != request.method or record.path != request.path \
+                    or (record.request_hash and record.request_hash != request_hash):
+                return Response({"error": "Cette clé d'idempotence a déjà été utilisée pour une autre requête"},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.status_code is None:
+                return Response({"error": "Une requête identique est en cours de traitement"},
+                                status=status.HTTP_409_CONFLICT)
+            response = Response(record.response_body, status=record.status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS_CODES:
+            record.delete()
+        else:
+            record.status_code = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=['status_code', 'response_body'])
+        return response
+    
+    return wrapper
+
+
+def purge_expired_keys():
+    """Supprime les clés plus anciennes que IDEMPOTENCY_KEY_TTL_HOURS. Retourne le nombre supprimé."""
+    cutoff = timezone.now() - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,167 @@
+import csv
+import io
+from functools import partial
+
+import requests
+from django.conf import settings
+from django.db import transaction
+
+from order_management.db_routers import mark_recent_write
+from order_management.metrics import update_queue_depth
+from order_management.sites import default_site, site_database
+
+from .models import Order, ArchivedOrder, OrderEvent
+
+# Taille des lots pour les requêtes IN et les insertions groupées
+IMPORT_BATCH_SIZE = 500
+
+REFERENCE_MAX_LENGTH = Order._meta.get_field('reference').max_length
+CART_NUMBER_MAX_LENGTH = Order._meta.get_field('cart_number').max_length
+
+
+class ImportSourceError(Exception):
+    """La source des commandes (fichier ou API PrestaShop) est illisible ou injoignable"""
+
+
+def rows_from_csv(file):
+    """
+    Lit un fichier CSV avec les colonnes `reference` (obligatoire),
+    `cart_number` et `line_count`. Accepte un fichier texte ou binaire.
+    """
+    content = file.read()
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ImportSourceError("Le fichier doit être encodé en UTF-8")
+    
+    sample = content[:2048]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    
+    reader = csv.DictReader(io.StringIO(content), dialect=dialect)
+    if not reader.fieldnames or 'reference' not in reader.fieldnames:
+        raise ImportSourceError("Colonne 'reference' manquante dans le fichier CSV")
+    return list(reader)
+
+
+def presta_orders(payload):
+    """Commandes d'une réponse de l'API PrestaShop, qui renvoie `[]` quand il n'y en a aucune"""
+    if isinstance(payload, dict):
+        return payload.get("orders") or []
+    return []
+
+
+def rows_from_prestashop(date=None):
+    """
+    Récupère les commandes PrestaShop (toutes, ou celles du jour `date` au
+    format YYYY-MM-DD). Le nombre de lignes est celui des lignes de commande.
+    """
+    if not settings.PRESTASHOP_API_KEY:
+        raise ImportSourceError("Clé de l'API PrestaShop non configurée (PRESTASHOP_API_KEY)")
+    try:
+        response = requests.get(f"{settings.PRESTASHOP_API_URL}/orders", params={
+            "output_format": "JSON",
+            "ws_key": settings.PRESTASHOP_API_KEY,
+            "display": "full"
+        }, timeout=30)
+    except requests.RequestException as error:
+        raise ImportSourceError(f"Erreur lors de la connexion à l'API PrestaShop: {error}")
+    if response.status_code != 200:
+        raise ImportSourceError(f"Erreur lors de la connexion à l'API PrestaShop: {response.status_code}")
+    
+    rows = []
+    for order in presta_orders(response.json()):
+        if date and not order.get('date_add', '').startswith(date):
+            continue
+        order_rows = (order.get('associations') or {}).get('order_rows') or []
+        rows.append({
+            'reference': order.get('reference'),
+            # Le numéro de chariot est attribué dans l'entrepôt
+            'cart_number': '',
+            'line_count': len(order_rows) or None,
+        })
+    return rows
+
+
+def import_orders(rows, creator):
+    """
+    Crée les commandes absentes de la base à partir de dictionnaires
+    `reference` / `cart_number` / `line_count`.
+    
+    Les références déjà connues (commandes actives ou archivées) sont
+    recherchées par lots avec `reference__in`, puis les nouvelles commandes
+    sont insérées avec `bulk_create`. Retourne un résumé de l'import.
+    """
+    invalid = []
+    candidates = {}
+    for row_number, row in enumerate(rows, start=1):
+        reference = (row.get('reference') or '').strip()
+        cart_number = (row.get('cart_number') or '').strip()
+        line_count = row.get('line_count')
+        
+        if not reference or len(reference) > REFERENCE_MAX_LENGTH:
+            invalid.append({'row': row_number, 'reference': reference, 'error': "Référence invalide"})
+            continue
+        if len(cart_number) > CART_NUMBER_MAX_LENGTH:
+            invalid.append({'row': row_number, 'reference': reference, 'error': "Numéro de chariot trop long"})
+            continue
+        if line_count in (None, ''):
+            line_count = None
+        else:
+            try:
+                line_count = int(line_count)
+            except (ValueError, TypeError):
+                line_count = 0
+            if line_count < 1:
+                invalid.append({'row': row_number, 'reference': reference, 'error': "Nombre de lignes invalide"})
+                continue
+        
+        # En cas de doublon dans la source, la première ligne est conservée
+        candidates.setdefault(reference, Order(
+            reference=reference, cart_number=cart_number, line_count=line_count, creator=creator
+        ))
+    
+    # Références uniques par site : seules celles du site des commandes créées comptent
+    site = default_site()
+    references = list(candidates)
+    existing = set()
+    for start in range(0, len(references), IMPORT_BATCH_SIZE):
+        batch = references[start:start + IMPORT_BATCH_SIZE]
+        for model in (Order, ArchivedOrder):
+            existing.update(
+                model.all_sites.filter(site=site, reference__in=batch).values_list('reference', flat=True)
+            )
+    
+    new_orders = [order for reference, order in candidates.items() if reference not in existing]
+    
+    with transaction.atomic(using=site_database()):
+        # ignore_conflicts couvre les commandes créées entre la vérification et l'insertion
+        Order.objects.bulk_create(new_orders, batch_size=IMPORT_BATCH_SIZE, ignore_conflicts=True)
+        
+        # Les identifiants ne sont pas renvoyés avec ignore_conflicts : relire
+        # les commandes réellement créées pour alimenter le journal
+        new_references = [order.reference for order in new_orders]
+        created = []
+        for start in range(0, len(new_references), IMPORT_BATCH_SIZE):
+            created += list(
+                Order.objects.filter(
+                    reference__in=new_references[start:start + IMPORT_BATCH_SIZE],
+                    creator=creator, version=0
+                ).values_list('id', 'created_at')
+            )
+        OrderEvent.objects.bulk_create([
+            OrderEvent(order_id=order_id, to_status='CREATED', user=creator, timestamp=created_at)
+            for order_id, created_at in created
+        ], batch_size=IMPORT_BATCH_SIZE)
+        transaction.on_commit(partial(mark_recent_write, creator), using=site_database())
+        update_queue_depth(to_status='CREATED', count=len(created))
+    
+    return {
+        'created_count': len(created),
+        'existing_count': len(candidates) - len(created),
+        'invalid_count': len(invalid),
+        'invalid': invalid,
+    }
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from order_management.sites import sites_by_database, use_site
+from orders.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = "Archive les commandes emballées depuis plus de N jours"
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help="Ancienneté minimale (en jours) des commandes emballées à archiver"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Nombre de commandes déplacées par transaction"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Affiche le nombre de commandes archivables sans les déplacer"
+        )
+    
+    def handle(self, *args, **options):
+        count = 0
+        for site in sites_by_database():
+            with use_site(site):
+                count += archive_orders(
+                    days=options['days'],
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run']
+                )
+        
+        if options['dry_run']:
+            self.stdout.write(f"{count} commande(s) archivable(s)")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{count} commande(s) archivée(s)"))
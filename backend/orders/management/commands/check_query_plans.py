@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from order_management.slow_queries import uses_table_scan
+from orders.models import Order
+from orders.views import prefix_filter
+
+
+def hot_queries():
+    """Requêtes les plus fréquentes de l'application, qui doivent utiliser un index"""
+    now = timezone.now()
+    start, end = now - timedelta(days=1), now
+    return {
+        'listes des modules': Order.objects.filter(
+            status='CREATED', created_at__gte=start, created_at__lt=end
+        ).order_by('-created_at'),
+        'commandes du jour': Order.objects.filter(created_at__gte=start, created_at__lt=end),
+        # Requêtes d'une requête HTTP, restreintes au site de l'utilisateur
+        'file du site': Order.objects.filter(
+            site=settings.DEFAULT_SITE, status='CREATED', created_at__gte=start, created_at__lt=end
+        ).order_by('-created_at'),
+        'commandes emballées du jour': Order.objects.filter(
+            status='PACKED', packed_at__gte=start, packed_at__lt=end
+        ),
+        'backlog': Order.objects.exclude(status='PACKED').order_by('status', 'created_at'),
+        'référence': Order.objects.filter(reference='CMD-0001'),
+        'chariot': Order.objects.filter(cart_number='C-01').exclude(status='PACKED'),
+        'recherche': Order.objects.filter(
+            prefix_filter('reference', 'CMD') | prefix_filter('cart_number', 'CMD')
+        )[:10],
+        'réservation': Order.objects.filter(status='CREATED').filter(
+            Q(claimed_until__isnull=True) | Q(claimed_until__lt=now)
+        ).order_by('created_at')[:1],
+    }
+
+
+class Command(BaseCommand):
+    help = ("Vérifie que les requêtes fréquentes utilisent un index "
+            "(échoue si l'une d'elles parcourt toute la table des commandes)")
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Affiche tous les plans")
+    
+    def handle(self, *args, **options):
+        table = Order._meta.db_table
+        
+        # Sur une petite base, PostgreSQL préfère parcourir la table :
+        # on lui interdit pour voir si un index est utilisable
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+        
+        failures = []
+        for name, queryset in hot_queries().items():
+            plan = queryset.explain()
+            if uses_table_scan(plan, table):
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"{name} : parcours complet de {table}"))
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{name} : OK"))
+                if options['verbose_plans']:
+                    self.stdout.write(plan)
+        
+        if failures:
+            raise CommandError(f"{len(failures)} requête(s) sans index : {', '.join(failures)}")
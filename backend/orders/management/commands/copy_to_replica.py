@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copie la base SQLite `default` dans la réplique SQLite (essais en local "
+        "de la réplique en lecture ; en production, la réplication s'en charge)"
+    )
+    
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASE:
+            raise CommandError("Aucune réplique configurée (DB_REPLICA_NAME)")
+        
+        source, target = connections['default'], connections[settings.REPLICA_DATABASE]
+        if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+            raise CommandError("La copie n'est possible qu'entre deux bases SQLite")
+        
+        # API de sauvegarde SQLite : copie cohérente, même pendant des écritures
+        target.close()
+        source.ensure_connection()
+        destination = sqlite3.connect(str(target.settings_dict['NAME']))
+        try:
+            source.connection.backup(destination)
+        finally:
+            destination.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Base {source.settings_dict['NAME']} copiée dans {target.settings_dict['NAME']}"
+        ))
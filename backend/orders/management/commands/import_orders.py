@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from order_management.sites import use_site
+
+from orders.importers import rows_from_csv, rows_from_prestashop, import_orders, ImportSourceError
+
+
+class Command(BaseCommand):
+    help = "Importe des commandes depuis un fichier CSV ou l'API PrestaShop"
+    
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--csv', help="Fichier CSV (colonnes reference, cart_number, line_count)")
+        source.add_argument('--prestashop', action='store_true', help="Importer les commandes PrestaShop")
+        parser.add_argument('--date', help="Avec --prestashop : ne garder que les commandes de ce jour (YYYY-MM-DD)")
+        parser.add_argument('--creator', required=True, help="Nom d'utilisateur enregistré comme créateur des commandes")
+    
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            creator = User.objects.get(username=options['creator'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur introuvable: {options['creator']}")
+        
+        try:
+            if options['csv']:
+                with open(options['csv'], 'rb') as file:
+                    rows = rows_from_csv(file)
+            else:
+                rows = rows_from_prestashop(options['date'])
+        except (ImportSourceError, OSError) as error:
+            raise CommandError(str(error))
+        
+        # Commandes rattachées au site du créateur
+        with use_site(creator.site):
+            result = import_orders(rows, creator)
+        
+        for error in result['invalid']:
+            self.stderr.write(f"Enregistrement {error['row']} ({error['reference']}): {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['created_count']} commande(s) créée(s), "
+            f"{result['existing_count']} déjà existante(s), "
+            f"{result['invalid_count']} invalide(s)"
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from order_management.sites import sites_by_database, use_site
+from orders.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Supprime les clés d'idempotence expirées"
+    
+    def handle(self, *args, **options):
+        count = 0
+        for site in sites_by_database():
+            with use_site(site):
+                count += purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f"{count} clé(s) d'idempotence supprimée(s)"))
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:11
+
+import django.db.models.deletion
+import orders.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_line_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('reference', models.CharField(max_length=50, unique=True)),
+                ('status', models.CharField(choices=[('CREATED', 'Créée'), ('PREPARED', 'Préparée'), ('CONTROLLED', 'Contrôlée'), ('PACKED', 'Emballée'), ('COMPLETED', 'Terminée')], max_length=20)),
+                ('cart_number', models.CharField(max_length=50, verbose_name='Numéro de chariot')),
+                ('line_count', models.PositiveIntegerField(blank=True, null=True, verbose_name='Nombre de lignes')),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('prepared_at', models.DateTimeField(blank=True, null=True)),
+                ('controlled_at', models.DateTimeField(blank=True, null=True)),
+                ('packed_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('controller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_controlled_orders', to=settings.AUTH_USER_MODEL)),
+                ('creator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_created_orders', to=settings.AUTH_USER_MODEL)),
+                ('packer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_packed_orders', to=settings.AUTH_USER_MODEL)),
+                ('preparer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_prepared_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            bases=(orders.models.OrderTimesMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('CREATED', 'Créée'), ('PREPARED', 'Préparée'), ('CONTROLLED', 'Contrôlée'), ('PACKED', 'Emballée'), ('COMPLETED', 'Terminée')], max_length=20)),
+                ('to_status', models.CharField(choices=[('CREATED', 'Créée'), ('PREPARED', 'Préparée'), ('CONTROLLED', 'Contrôlée'), ('PACKED', 'Emballée'), ('COMPLETED', 'Terminée')], max_length=20)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='orders.order')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timestamp'], name='orders_orde_timesta_157743_idx'), models.Index(fields=['user', 'timestamp'], name='orders_orde_user_id_7aab63_idx')],
+            },
+        ),
+    ]
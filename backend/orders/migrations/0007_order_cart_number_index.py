@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:15
+
+from django.db import migrations, models
+
+
+# Index pour les recherches LIKE 'prefix%' (PostgreSQL uniquement, les
+# autres moteurs utilisent les index standards avec des comparaisons de bornes)
+PATTERN_INDEXES = (
+    ('orders_order_reference_pattern_idx', 'reference'),
+    ('orders_order_cart_number_pattern_idx', 'cart_number'),
+)
+
+
+def create_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in PATTERN_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON orders_order ({column} text_pattern_ops)'
+        )
+
+
+def drop_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in PATTERN_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_stage_timestamp_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='cart_number',
+            field=models.CharField(db_index=True, max_length=50, verbose_name='Numéro de chariot'),
+        ),
+        migrations.RunPython(create_pattern_indexes, drop_pattern_indexes),
+    ]
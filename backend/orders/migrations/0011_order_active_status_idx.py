@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_order_status_created_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'PACKED'), _negated=True), fields=['status', 'created_at'], name='order_active_status_idx'),
+        ),
+    ]
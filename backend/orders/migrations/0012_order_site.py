@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:37
+
+import order_management.sites
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_order_active_status_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='site',
+            field=models.CharField(default=order_management.sites.default_site, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='site',
+            field=models.CharField(default=order_management.sites.default_site, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['site', 'created_at'], name='archivedorder_site_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['site', 'status', 'created_at'], name='order_site_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['site', 'created_at'], name='order_site_created_idx'),
+        ),
+    ]
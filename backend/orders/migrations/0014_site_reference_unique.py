@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_idempotencykey_request_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedorder',
+            name='reference',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='reference',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='archivedorder',
+            constraint=models.UniqueConstraint(fields=('site', 'reference'), name='archivedorder_site_reference_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('site', 'reference'), name='order_site_reference_uniq'),
+        ),
+    ]
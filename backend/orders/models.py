@@ -1,8 +1,35 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 from authentication.models import User
+from order_management.sites import SiteManager, default_site
+
+class OrderTimesMixin:
+    """Durées de traitement (en minutes) communes aux commandes actives et archivées"""
+    
+    def preparation_time(self):
+        if self.prepared_at and self.created_at:
+            return (self.prepared_at - self.created_at).total_seconds() / 60
+        return None
+    
+    def control_time(self):
+        if self.controlled_at and self.prepared_at:
+            return (self.controlled_at - self.prepared_at).total_seconds() / 60
+        return None
+    
+    def packing_time(self):
+        if self.packed_at and self.controlled_at:
+            return (self.packed_at - self.controlled_at).total_seconds() / 60
+        return None
+    
+    def total_time(self):
+        if self.completed_at and self.created_at:
+            return (self.completed_at - self.created_at).total_seconds() / 60
+        return None
 
 # Create your models here.
-class Order(models.Model):
+class Order(OrderTimesMixin, models.Model):
     STATUS_CHOICES = (
         ('CREATED', 'Créée'),
         ('PREPARED', 'Préparée'),
@@ -11,9 +38,12 @@ class Order(models.Model):
         ('COMPLETED', 'Terminée'),
     )
     
-    reference = models.CharField(max_length=50, unique=True)
+    # Unique dans un site (contrainte order_site_reference_uniq)
+    reference = models.CharField(max_length=50, db_index=True)
+    # Entrepôt de la commande : toutes les requêtes sont restreintes au site courant
+    site = models.CharField(max_length=50, default=default_site)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='CREATED')
-    cart_number = models.CharField(max_length=50, verbose_name="Numéro de chariot")
+    cart_number = models.CharField(max_length=50, db_index=True, verbose_name="Numéro de chariot")
     
     # Nombre de lignes (articles) dans la commande
     line_count = models.PositiveIntegerField(null=True, blank=True, verbose_name="Nombre de lignes")
@@ -31,25 +61,157 @@ class Order(models.Model):
     packed_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
-    def preparation_time(self):
-        if self.prepared_at and self.created_at:
-            return (self.prepared_at - self.created_at).total_seconds() / 60
-        return None
+    # Réservation temporaire par un agent (répartition du travail, voir orders/dispatch.py)
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='claimed_orders')
+    claimed_until = models.DateTimeField(null=True, blank=True)
     
-    def control_time(self):
-        if self.controlled_at and self.prepared_at:
-            return (self.controlled_at - self.prepared_at).total_seconds() / 60
-        return None
+    # Incrémentée à chaque modification (contrôle de concurrence optimiste)
+    version = models.PositiveIntegerField(default=0)
     
-    def packing_time(self):
-        if self.packed_at and self.controlled_at:
-            return (self.packed_at - self.controlled_at).total_seconds() / 60
-        return None
+    objects = SiteManager()
+    all_sites = models.Manager()
     
-    def total_time(self):
-        if self.completed_at and self.created_at:
-            return (self.completed_at - self.created_at).total_seconds() / 60
-        return None
+    class Meta:
+        # Index sur les horodatages d'étape pour les séries de débit par période
+        indexes = [
+            models.Index(fields=['created_at']),
+            # Tableau des commandes filtré par statut sur une période
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['prepared_at']),
+            models.Index(fields=['controlled_at']),
+            models.Index(fields=['packed_at']),
+            # Index partiel des commandes en cours : sa taille suit le volume
+            # de travail en attente, pas l'historique des commandes emballées
+            models.Index(
+                fields=['status', 'created_at'],
+                condition=~models.Q(status='PACKED'),
+                name='order_active_status_idx'
+            ),
+            # Files d'attente et tableaux d'un site
+            models.Index(fields=['site', 'status', 'created_at'], name='order_site_status_idx'),
+            models.Index(fields=['site', 'created_at'], name='order_site_created_idx'),
+        ]
+        constraints = [
+            # Une référence par site : deux entrepôts peuvent avoir la même
+            models.UniqueConstraint(fields=['site', 'reference'], name='order_site_reference_uniq'),
+        ]
+    
+    def save_if_unchanged(self, update_fields):
+        """
+        Enregistre les champs `update_fields` seulement si la commande n'a pas
+        été modifiée depuis sa lecture (même version en base).
+        Retourne False si une autre requête l'a modifiée entre-temps.
+        """
+        values = {field: getattr(self, field) for field in update_fields}
+        updated = Order.objects.filter(pk=self.pk, version=self.version).update(
+            version=F('version') + 1, **values
+        )
+        if updated:
+            self.version += 1
+        return bool(updated)
+    
+    def is_claimed_by_other(self, user):
+        """Indique si la commande est réservée par un autre agent (réservation non expirée)"""
+        return (
+            self.claimed_by_id is not None
+            and self.claimed_by_id != user.id
+            and self.claimed_until is not None
+            and self.claimed_until > timezone.now()
+        )
     
     def __str__(self):
         return f"Commande {self.reference} ({self.get_status_display()})"
+
+
+class ArchivedOrder(OrderTimesMixin, models.Model):
+    """
+    Commande terminée déplacée hors de la table active par la commande
+    `archive_orders`. Conserve l'identifiant d'origine pour que les
+    statistiques puissent fusionner commandes actives et archivées.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    reference = models.CharField(max_length=50, db_index=True)
+    site = models.CharField(max_length=50, default=default_site)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    cart_number = models.CharField(max_length=50, verbose_name="Numéro de chariot")
+    line_count = models.PositiveIntegerField(null=True, blank=True, verbose_name="Nombre de lignes")
+    
+    # User relationships
+    creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_created_orders')
+    preparer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_prepared_orders')
+    controller = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_controlled_orders')
+    packer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_packed_orders')
+    
+    # Timestamps
+    created_at = models.DateTimeField(db_index=True)
+    prepared_at = models.DateTimeField(null=True, blank=True)
+    controlled_at = models.DateTimeField(null=True, blank=True)
+    packed_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = SiteManager()
+    all_sites = models.Manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['site', 'created_at'], name='archivedorder_site_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'reference'], name='archivedorder_site_reference_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"Commande archivée {self.reference} ({self.get_status_display()})"
+
+
+class OrderEvent(models.Model):
+    """
+    Journal des changements de statut des commandes, en ajout seul.
+    
+    Les événements sont conservés lorsque la commande est archivée ou
+    supprimée (pas de contrainte de clé étrangère sur `order`).
+    """
+    order = models.ForeignKey(
+        Order, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events'
+    )
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_events')
+    timestamp = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp']),
+            models.Index(fields=['user', 'timestamp']),
+        ]
+    
+    def __str__(self):
+        return f"{self.order_id}: {self.from_status or '-'} -> {self.to_status}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Réponse mémorisée pour un en-tête `Idempotency-Key`, afin que les
+    requêtes rejouées par les terminaux mobiles ne soient pas exécutées deux
+    fois. `status_code` est vide tant que la première requête est en cours.
+    Les clés expirent après IDEMPOTENCY_KEY_TTL_HOURS heures.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    # Empreinte (SHA-256) du corps de la requête : une clé réutilisée avec un autre contenu est refusée
+    request_hash = models.CharField(max_length=64, blank=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.key})"
@@ -1,6 +1,14 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import QuerySet
 from rest_framework import serializers
-from .models import Order
+from .models import Order, ArchivedOrder, OrderEvent
+from authentication.models import User
 from authentication.serializers import UserSerializer
+from order_management.db_routers import mark_recent_write
+from order_management.metrics import update_queue_depth
+from order_management.sites import default_site, site_database
 
 class OrderSerializer(serializers.ModelSerializer):
     preparation_time = serializers.SerializerMethodField()
@@ -21,11 +29,13 @@ class OrderSerializer(serializers.ModelSerializer):
             'controller', 'controller_details',
             'packer', 'packer_details',
             'created_at', 'prepared_at', 'controlled_at', 'packed_at', 'completed_at',
-            'preparation_time', 'control_time', 'packing_time', 'total_time'
+            'preparation_time', 'control_time', 'packing_time', 'total_time',
+            'version'
         )
         read_only_fields = (
             'id', 'creator', 'preparer', 'controller', 'packer',
-            'created_at', 'prepared_at', 'controlled_at', 'packed_at', 'completed_at'
+            'created_at', 'prepared_at', 'controlled_at', 'packed_at', 'completed_at',
+            'version'
         )
     
     def get_preparation_time(self, obj):
@@ -40,14 +50,112 @@ class OrderSerializer(serializers.ModelSerializer):
     def get_total_time(self, obj):
         return obj.total_time()
 
+# Utilisateurs associés à une commande (champs `<rôle>` et `<rôle>_details`)
+ORDER_USER_FIELDS = ('creator', 'preparer', 'controller', 'packer')
+
+# Formats de liste où les utilisateurs sont envoyés une seule fois (?format=...)
+COMPACT_FORMATS = ('compact', 'columnar')
+
+class CompactOrderSerializer(serializers.BaseSerializer):
+    """
+    Champs d'OrderSerializer sans les utilisateurs imbriqués : seuls leurs ids
+    sont envoyés. Les valeurs sont lues directement sur la commande, bien plus
+    vite qu'avec un ModelSerializer sur les longues listes.
+    """
+    fields = tuple(field for field in OrderSerializer.Meta.fields if not field.endswith('_details'))
+    datetime_fields = ('created_at', 'prepared_at', 'controlled_at', 'packed_at', 'completed_at')
+    time_fields = ('preparation_time', 'control_time', 'packing_time', 'total_time')
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Même rendu des dates qu'OrderSerializer (fuseau courant, ISO 8601)
+        self.to_datetime = serializers.DateTimeField().to_representation
+    
+    def to_representation(self, order):
+        data = {
+            'id': order.id,
+            'reference': order.reference,
+            'status': order.status,
+            'cart_number': order.cart_number,
+            'line_count': order.line_count,
+            'version': order.version
+        }
+        for field in ORDER_USER_FIELDS:
+            data[field] = getattr(order, f'{field}_id')
+        for field in self.datetime_fields:
+            value = getattr(order, field)
+            data[field] = self.to_datetime(value) if value else None
+        for field in self.time_fields:
+            data[field] = getattr(order, field)()
+        return {field: data[field] for field in self.fields}
+
+def order_user_ids(orders):
+    """Ids des utilisateurs référencés par une liste de commandes"""
+    return {
+        user_id
+        for order in orders
+        for user_id in (getattr(order, f'{field}_id') for field in ORDER_USER_FIELDS)
+        if user_id
+    }
+
+def compact_order_payload(orders, users, payload_format='compact'):
+    """
+    Liste de commandes au format compact : {'orders': [...], 'users': {id: utilisateur}}.
+    Avec payload_format='columnar', 'orders' est un tableau par champ ({champ: [valeurs]}),
+    plus léger pour les gros exports.
+    """
+    data = CompactOrderSerializer(orders, many=True).data
+    if payload_format == 'columnar':
+        data = {field: [order[field] for order in data] for field in CompactOrderSerializer.fields}
+    return {
+        'orders': data,
+        'users': {user['id']: user for user in UserSerializer(users, many=True).data}
+    }
+
+def serialize_order_list(orders, payload_format=None):
+    """
+    Sérialise une liste de commandes selon le format demandé : liste
+    d'OrderSerializer par défaut, payload compact pour COMPACT_FORMATS.
+    """
+    if payload_format not in COMPACT_FORMATS:
+        return OrderSerializer(orders, many=True).data
+    
+    if isinstance(orders, QuerySet):
+        # Les utilisateurs sont lus en une requête à part : inutile de les joindre
+        orders = orders.select_related(None)
+    orders = list(orders)
+    users = User.objects.filter(id__in=order_user_ids(orders))
+    return compact_order_payload(orders, users, payload_format)
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ('reference', 'cart_number', 'line_count')
     
+    def validate_reference(self, value):
+        # Unique dans le site de la commande créée, commandes archivées comprises
+        # (contraintes order_site_reference_uniq et archivedorder_site_reference_uniq)
+        site = default_site()
+        if any(model.all_sites.filter(site=site, reference=value).exists() for model in (Order, ArchivedOrder)):
+            raise serializers.ValidationError("Une commande avec cette référence existe déjà.")
+        return value
+    
     def create(self, validated_data):
         user = self.context['request'].user
-        return Order.objects.create(creator=user, **validated_data)
+        # Heure de la lecture sur le terminal (synchronisation hors connexion) : save(created_at=...)
+        created_at = validated_data.pop('created_at', None)
+        with transaction.atomic(using=site_database()):
+            order = Order.objects.create(creator=user, **validated_data)
+            if created_at is not None:
+                # created_at est renseigné à l'insertion (auto_now_add) : corrigé ensuite
+                Order.objects.filter(pk=order.pk).update(created_at=created_at)
+                order.created_at = created_at
+            OrderEvent.objects.create(
+                order=order, to_status=order.status, user=user, timestamp=order.created_at
+            )
+            transaction.on_commit(partial(mark_recent_write, user), using=site_database())
+            update_queue_depth(to_status=order.status)
+        return order
 
 class OrderUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,3 +1,564 @@
-from django.test import TestCase
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import IntegrityError, connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from authentication.authentication import UserRefreshToken
+from authentication.models import User
+from order_management import metrics
+from order_management.sites import use_site
+from .archive import archive_orders
+from .importers import import_orders, rows_from_prestashop, ImportSourceError
+from .dispatch import claim_next_order, claimable_orders
+from .models import Order, ArchivedOrder, OrderEvent, IdempotencyKey
+from .serializers import OrderCreateSerializer
+from .transitions import advance_order
+from .views import DashboardView
+
+
+def make_client(user):
+    client = APIClient(HTTP_HOST='localhost')
+    client.force_authenticate(user)
+    return client
+
+
+class OrderTestCase(TestCase):
+    """Un manager, un agent et des commandes créées à la demande"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', password='p', role='MANAGER')
+        cls.agent = User.objects.create_user('agent', password='p', role='AGENT')
+    
+    def setUp(self):
+        self.manager_client = make_client(self.manager)
+        self.agent_client = make_client(self.agent)
+    
+    def create_order(self, reference='CMD-1', **fields):
+        return Order.objects.create(reference=reference, cart_number='C-1', creator=self.agent, **fields)
+
+
+class ArchivedDashboardTests(OrderTestCase):
+    """Le tableau de bord d'une journée archivée compte les commandes archivées"""
+    
+    def setUp(self):
+        super().setUp()
+        # 10h, pour que toutes les étapes tombent le même jour
+        day = timezone.localdate() - timedelta(days=200)
+        created_at = timezone.make_aware(datetime.combine(day, time(10, 0)))
+        order = self.create_order(status='PACKED', line_count=3)
+        Order.objects.filter(pk=order.pk).update(
+            created_at=created_at,
+            prepared_at=created_at + timedelta(minutes=10),
+            controlled_at=created_at + timedelta(minutes=15),
+            packed_at=created_at + timedelta(minutes=30),
+            completed_at=created_at + timedelta(minutes=30),
+        )
+        self.assertEqual(archive_orders(days=90), 1)
+        self.date = day.isoformat()
+    
+    def assert_dashboard(self, data):
+        self.assertEqual(data['order_counts'], {'total': 1, 'in_progress': 0, 'completed': 1})
+        self.assertAlmostEqual(data['average_times']['preparation'], 10)
+        self.assertAlmostEqual(data['average_times']['total'], 30)
+    
+    def test_dashboard_includes_archive(self):
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(ArchivedOrder.objects.count(), 1)
+        response = self.manager_client.get('/api/orders/dashboard/', {'date': self.date})
+        self.assertEqual(response.status_code, 200)
+        self.assert_dashboard(response.json())
+    
+    def test_sync_dashboard_includes_archive(self):
+        request = APIRequestFactory().get('/api/orders/dashboard/', {'date': self.date})
+        force_authenticate(request, user=self.manager)
+        response = DashboardView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assert_dashboard(response.data)
+
+
+class ArchivedOrderListTests(OrderTestCase):
+    """Liste paginée des commandes actives et archivées, triée et bornée en base"""
+    
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        # CMD-0 (la plus récente) à CMD-5 : les trois plus anciennes sont archivées
+        for index, days in enumerate((1, 2, 3, 200, 201, 202)):
+            created_at = now - timedelta(days=days)
+            order = self.create_order(f'CMD-{index}', status='PACKED')
+            Order.objects.filter(pk=order.pk).update(
+                created_at=created_at, packed_at=created_at, completed_at=created_at
+            )
+        self.assertEqual(archive_orders(days=90), 3)
+    
+    def get_page(self, page, **params):
+        response = self.manager_client.get('/api/orders/', {'date': 'all', 'page': page, 'page_size': 2, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_pages_merge_live_and_archived(self):
+        references = []
+        for page in (1, 2, 3):
+            data = self.get_page(page)
+            self.assertEqual(data['count'], 6)
+            references += [order['reference'] for order in data['results']]
+        self.assertEqual(references, [f'CMD-{index}' for index in range(6)])
+        
+        data = self.get_page(2, ordering='created_at')
+        self.assertEqual([order['reference'] for order in data['results']], ['CMD-3', 'CMD-2'])
+    
+    def test_each_table_read_up_to_the_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page(2)
+        selects = [query['sql'] for query in queries if 'SELECT "orders_' in query['sql'] and 'COUNT(' not in query['sql']]
+        self.assertEqual(len(selects), 2)
+        for sql in selects:
+            self.assertIn('LIMIT 4', sql)
+    
+    def test_invalid_duration_filters(self):
+        for value in ('inf', 'nan', '1e300', 'abc'):
+            response = self.manager_client.get('/api/orders/', {'date': 'all', 'preparation_time_min': value})
+            self.assertEqual(response.status_code, 400, value)
+        response = self.manager_client.get('/api/orders/', {'date': 'all', 'total_time_max': '90.5'})
+        self.assertEqual(response.status_code, 200)
+    
+    def test_search_by_reference_prefix(self):
+        self.create_order('XCMD-9')
+        data = self.get_page(1, search='CMD-')
+        self.assertEqual(data['count'], 6)
+        data = self.get_page(1, search='CMD-4')
+        self.assertEqual([order['reference'] for order in data['results']], ['CMD-4'])
+
+
+class VersionConflictTests(OrderTestCase):
+    """Contrôle de concurrence optimiste : version comparée à l'écriture, 409 en cas de conflit"""
+    
+    def test_stale_version_returns_409(self):
+        order = self.create_order()
+        Order.objects.filter(pk=order.pk).update(version=F('version') + 1)
+        
+        response = self.agent_client.post(f'/api/orders/{order.pk}/prepare/', {'version': 0}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 1)
+        
+        response = self.manager_client.put(f'/api/orders/{order.pk}/', {'cart_number': 'C-2', 'version': 0}, format='json')
+        self.assertEqual(response.status_code, 409)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.cart_number, order.version), ('CREATED', 'C-1', 1))
+    
+    def test_write_after_concurrent_change_returns_409(self):
+        """Commande modifiée entre la lecture et l'écriture de la vue"""
+        order = self.create_order()
+        
+        def concurrent_update(user):
+            Order.objects.filter(pk=order.pk).update(version=F('version') + 1)
+            return False
+        
+        with mock.patch.object(Order, 'is_claimed_by_other', side_effect=concurrent_update):
+            response = self.agent_client.post(f'/api/orders/{order.pk}/prepare/', {'line_count': 4}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 1)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.line_count), ('CREATED', None))
+        self.assertFalse(OrderEvent.objects.filter(order=order, to_status='PREPARED').exists())
+    
+    def test_advance_increments_version_and_logs_event(self):
+        order = self.create_order()
+        response = self.agent_client.post(
+            f'/api/orders/{order.pk}/prepare/', {'line_count': 4, 'version': 0}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], 1)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.version, order.line_count), ('PREPARED', 1, 4))
+        event = OrderEvent.objects.get(order=order, to_status='PREPARED')
+        self.assertEqual((event.from_status, event.user), ('CREATED', self.agent))
+        self.assertEqual(event.timestamp, order.prepared_at)
+    
+    def test_second_stale_copy_is_rejected(self):
+        order = self.create_order()
+        first, second = Order.objects.get(pk=order.pk), Order.objects.get(pk=order.pk)
+        self.assertTrue(advance_order(first, 'prepare', self.agent))
+        self.assertFalse(advance_order(second, 'prepare', self.manager))
+        order.refresh_from_db()
+        self.assertEqual((order.version, order.preparer), (1, self.agent))
+        self.assertEqual(OrderEvent.objects.filter(order=order, to_status='PREPARED').count(), 1)
+    
+    def test_event_failure_rolls_back_order_update(self):
+        """La commande et son événement sont écrits dans la même transaction"""
+        order = self.create_order()
+        with mock.patch('orders.transitions.OrderEvent.objects.create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                advance_order(order, 'prepare', self.agent)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.version), ('CREATED', 0))
+
+
+class ClaimTests(OrderTestCase):
+    """Réservation de la prochaine commande d'une étape, expiration et libération"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_agent = User.objects.create_user('agent2', password='p', role='AGENT')
+    
+    def setUp(self):
+        super().setUp()
+        self.other_client = make_client(self.other_agent)
+        self.first = self.create_order('CMD-1', line_count=9)
+        self.second = self.create_order('CMD-2', line_count=2)
+    
+    def claim(self, client, **data):
+        return client.post('/api/orders/preparation/claim/', data, format='json')
+    
+    def test_agents_claim_different_orders(self):
+        first = self.claim(self.agent_client)
+        second = self.claim(self.other_client)
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(first.json()['id'], self.first.pk)
+        self.assertEqual(second.json()['id'], self.second.pk)
+        
+        # Plus rien à réserver pour un troisième agent
+        self.assertEqual(self.claim(self.manager_client).status_code, 204)
+    
+    def test_claim_is_renewed_for_same_agent(self):
+        first = self.claim(self.agent_client).json()
+        again = self.claim(self.agent_client).json()
+        self.assertEqual(again['id'], first['id'])
+        self.assertEqual(Order.objects.filter(claimed_by=self.agent).count(), 1)
+    
+    def test_line_count_policy(self):
+        response = self.claim(self.agent_client, policy='line_count')
+        self.assertEqual(response.json()['id'], self.second.pk)
+        self.assertEqual(self.claim(self.agent_client, policy='unknown').status_code, 400)
+    
+    def test_expired_lease_can_be_claimed(self):
+        claimed = claim_next_order('prepare', self.agent)
+        self.assertEqual(claimed.pk, self.first.pk)
+        
+        now = timezone.now()
+        self.assertNotIn(claimed.pk, claimable_orders('prepare', self.other_agent, now).values_list('pk', flat=True))
+        Order.objects.filter(pk=claimed.pk).update(claimed_until=now - timedelta(seconds=1))
+        self.assertEqual(claim_next_order('prepare', self.other_agent).pk, self.first.pk)
+    
+    def test_claimed_order_rejects_other_agent(self):
+        order_id = self.claim(self.agent_client).json()['id']
+        response = self.other_client.post(f'/api/orders/{order_id}/prepare/', {}, format='json')
+        self.assertEqual(response.status_code, 409)
+        response = self.agent_client.post(f'/api/orders/{order_id}/prepare/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # La validation libère la réservation
+        order = Order.objects.get(pk=order_id)
+        self.assertEqual((order.claimed_by, order.claimed_until), (None, None))
+    
+    def test_release(self):
+        order_id = self.claim(self.agent_client).json()['id']
+        self.assertEqual(self.other_client.post(f'/api/orders/{order_id}/release/').status_code, 403)
+        response = self.agent_client.post(f'/api/orders/{order_id}/release/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(Order.objects.get(pk=order_id).claimed_by)
+        self.assertEqual(self.claim(self.other_client).json()['id'], order_id)
+
+
+class CartTests(OrderTestCase):
+    """Validation groupée des commandes d'un chariot"""
+    
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_order('CMD-1')
+        self.second = self.create_order('CMD-2')
+        self.create_order('CMD-3', status='PACKED')
+        self.create_order('CMD-4', status='COMPLETED')
+    
+    def test_open_orders_exclude_terminal_statuses(self):
+        response = self.agent_client.get('/api/orders/cart/C-1/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([order['reference'] for order in data['orders']], ['CMD-1', 'CMD-2'])
+        self.assertEqual(data['counts'], {'CREATED': 2, 'PREPARED': 0, 'CONTROLLED': 0})
+    
+    def test_advance_cart(self):
+        response = self.agent_client.post('/api/orders/cart/C-1/', {'stage': 'prepare'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['advanced_count'], 2)
+        self.assertEqual(
+            set(Order.objects.filter(reference__in=['CMD-1', 'CMD-2']).values_list('status', flat=True)),
+            {'PREPARED'}
+        )
+        self.assertEqual(OrderEvent.objects.filter(to_status='PREPARED').count(), 2)
+    
+    def test_orders_not_ready_block_cart(self):
+        self.assertTrue(advance_order(self.first, 'prepare', self.agent))
+        response = self.agent_client.post('/api/orders/cart/C-1/', {'stage': 'control'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['references'], ['CMD-2'])
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.status, 'PREPARED')
+    
+    def test_invalid_stage(self):
+        response = self.agent_client.post('/api/orders/cart/C-1/', {'stage': 'ship'})
+        self.assertEqual(response.status_code, 400)
+
+
+class IdempotencyTests(OrderTestCase):
+    """En-tête Idempotency-Key : les requêtes rejouées ne sont pas réexécutées"""
+    
+    def create(self, reference='CMD-1', key='scan-1', client=None):
+        return (client or self.agent_client).post(
+            '/api/orders/', {'reference': reference, 'cart_number': 'C-1'},
+            format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+    
+    def test_replay_returns_stored_response(self):
+        first = self.create()
+        self.assertEqual(first.status_code, 201)
+        with CaptureQueriesContext(connection) as queries:
+            replay = self.create()
+        # Seule la tentative d'enregistrement de la clé écrit (et échoue sur l'unicité)
+        self.assertFalse([query for query in queries if 'INSERT INTO "orders_order' in query['sql']])
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+    
+    def test_key_deleted_during_claim(self):
+        # Insertion en conflit, mais la clé a disparu avant d'être relue : deux fois de suite
+        with mock.patch('orders.idempotency.IdempotencyKey.objects.create', side_effect=IntegrityError):
+            response = self.create()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+    
+    def test_replayed_transition_is_not_executed_twice(self):
+        order = self.create_order()
+        url = f'/api/orders/{order.pk}/prepare/'
+        first = self.agent_client.post(url, {'line_count': 3}, format='json', HTTP_IDEMPOTENCY_KEY='prep-1')
+        replay = self.agent_client.post(url, {'line_count': 3}, format='json', HTTP_IDEMPOTENCY_KEY='prep-1')
+        self.assertEqual((first.status_code, replay.status_code), (200, 200))
+        self.assertEqual(replay.json()['version'], 1)
+        self.assertEqual(OrderEvent.objects.filter(order=order, to_status='PREPARED').count(), 1)
+    
+    def test_same_key_with_other_payload_returns_422(self):
+        self.assertEqual(self.create('CMD-1').status_code, 201)
+        response = self.create('CMD-2')
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Order.objects.filter(reference='CMD-2').exists())
+    
+    def test_keys_are_per_user(self):
+        self.assertEqual(self.create('CMD-1').status_code, 201)
+        self.assertEqual(self.create('CMD-2', client=self.manager_client).status_code, 201)
+    
+    def test_concurrent_duplicate_creates_one_order(self):
+        """
+        Une requête identique arrive pendant l'exécution de la première : sa clé
+        heurte la contrainte d'unicité et elle est refusée sans créer de commande.
+        """
+        concurrent_responses = []
+        original_create = OrderCreateSerializer.create
+        
+        def create_with_duplicate(serializer, validated_data):
+            concurrent_responses.append(self.create())
+            return original_create(serializer, validated_data)
+        
+        with mock.patch.object(OrderCreateSerializer, 'create', create_with_duplicate):
+            response = self.create()
+        
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(concurrent_responses[0].status_code, 409)
+        self.assertEqual(Order.objects.count(), 1)
+        
+        # Une fois la première terminée, la requête rejouée reçoit sa réponse
+        replay = self.create()
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay.json()['id'], response.json()['id'])
+
+
+class OrderSyncTests(OrderTestCase):
+    """Synchronisation des lectures hors connexion, avec leurs horodatages"""
+    
+    def sync(self, operations):
+        response = self.agent_client.post('/api/orders/sync/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_replayed_batch_keeps_scan_timestamps(self):
+        # Lectures faites hors connexion trois heures plus tôt
+        scanned_at = timezone.now() - timedelta(hours=3)
+        stamps = [(scanned_at + timedelta(minutes=minutes)).isoformat() for minutes in (0, 12, 20, 35)]
+        data = self.sync([
+            {'op': 'create', 'reference': 'SYNC-1', 'cart_number': 'C-1', 'timestamp': stamps[0]},
+            {'op': 'prepare', 'reference': 'SYNC-1', 'line_count': 5, 'timestamp': stamps[1]},
+            {'op': 'control', 'reference': 'SYNC-1', 'timestamp': stamps[2]},
+            {'op': 'pack', 'reference': 'SYNC-1', 'timestamp': stamps[3]},
+        ])
+        self.assertEqual(data['summary'], {'ok': 4})
+        
+        order = Order.objects.get(reference='SYNC-1')
+        self.assertEqual(order.created_at, scanned_at)
+        self.assertEqual(OrderEvent.objects.get(order=order, to_status='CREATED').timestamp, scanned_at)
+        self.assertAlmostEqual(order.preparation_time(), 12)
+        self.assertAlmostEqual(order.control_time(), 8)
+        self.assertAlmostEqual(order.packing_time(), 15)
+        self.assertAlmostEqual(order.total_time(), 35)
+    
+    def test_stage_before_previous_stage_is_rejected(self):
+        order = self.create_order('SYNC-2')
+        before_creation = (order.created_at - timedelta(minutes=10)).isoformat()
+        data = self.sync([
+            {'op': 'prepare', 'reference': 'SYNC-2', 'timestamp': before_creation},
+            {'op': 'prepare', 'reference': 'SYNC-2', 'timestamp': timezone.now().isoformat()},
+            {'op': 'control', 'reference': 'SYNC-2', 'timestamp': before_creation},
+        ])
+        self.assertEqual([result['result'] for result in data['results']], ['error', 'ok', 'error'])
+        self.assertIn("antérieur", data['results'][0]['error'])
+        
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PREPARED')
+        self.assertGreaterEqual(order.preparation_time(), 0)
+    
+    
+    def test_invalid_operations_rejected_one_by_one(self):
+        self.create_order('SYNC-3')
+        data = self.sync([
+            {'op': 'create', 'reference': 'SYNC-4', 'cart_number': 'C-1', 'timestamp': '2024-02-30T10:00:00'},
+            {'op': 'prepare', 'order_id': [1, 2]},
+            {'op': 'prepare', 'order_id': {'id': 1}},
+            {'op': 'prepare', 'reference': ['SYNC-3']},
+            {'op': 'prepare', 'reference': 'SYNC-3'},
+        ])
+        self.assertEqual([result['result'] for result in data['results']], ['error'] * 4 + ['ok'])
+        self.assertIn("Horodatage invalide", data['results'][0]['error'])
+        self.assertFalse(Order.objects.filter(reference='SYNC-4').exists())
+
+
+class QueueDepthMetricsTests(OrderTestCase):
+    """Files d'attente suivies en mémoire et recomptées en base périodiquement"""
+    
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(metrics, '_queue_seeded_at', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        metrics.ORDER_QUEUE_DEPTH.values.clear()
+        self.addCleanup(metrics.ORDER_QUEUE_DEPTH.values.clear)
+    
+    def queue_depth(self):
+        return {status: value for (status,), value in metrics.ORDER_QUEUE_DEPTH.values.items()}
+    
+    def test_seeded_once_then_updated_in_process(self):
+        order = self.create_order('CMD-1')
+        self.create_order('CMD-2', status='PREPARED')
+        self.create_order('CMD-3', status='PACKED')
+        
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('orders_queue_depth{status="CREATED"} 1', response.content.decode())
+        self.assertEqual(self.queue_depth(), {'CREATED': 1, 'PREPARED': 1, 'CONTROLLED': 0})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.agent_client.post('/api/orders/', {'reference': 'CMD-4', 'cart_number': 'C-4'})
+        self.assertEqual(response.status_code, 201)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(advance_order(order, 'prepare', self.agent))
+        self.assertEqual(self.queue_depth(), {'CREATED': 1, 'PREPARED': 2, 'CONTROLLED': 0})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.manager_client.delete(f'/api/orders/{order.pk}/')
+        self.assertEqual(response.status_code, 204)
+        
+        # Pas de nouveau comptage en base avant METRICS_QUEUE_RESEED_SECONDS
+        with self.assertNumQueries(0):
+            response = self.client.get('/metrics')
+        self.assertIn('orders_queue_depth{status="PREPARED"} 1', response.content.decode())
+    
+    def test_changes_from_other_processes_picked_up_on_reseed(self):
+        self.client.get('/metrics')
+        # Commandes créées hors de ce processus (autre worker, import_orders...)
+        self.create_order('CMD-1')
+        self.create_order('CMD-2')
+        self.assertEqual(self.queue_depth()['CREATED'], 0)
+        
+        with override_settings(METRICS_QUEUE_RESEED_SECONDS=0):
+            response = self.client.get('/metrics')
+        self.assertIn('orders_queue_depth{status="CREATED"} 2', response.content.decode())
+    
+    def test_first_change_seeds_from_database(self):
+        self.create_order('CMD-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agent_client.post('/api/orders/', {'reference': 'CMD-2', 'cart_number': 'C-2'})
+        # Le comptage fait après le commit inclut déjà la nouvelle commande
+        self.assertEqual(self.queue_depth(), {'CREATED': 2, 'PREPARED': 0, 'CONTROLLED': 0})
+
+
+class PrestashopImportTests(TestCase):
+    """Lecture des commandes de l'API PrestaShop"""
+    
+    def fetch(self, payload):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = payload
+        with mock.patch('orders.importers.requests.get', return_value=response):
+            return rows_from_prestashop()
+    
+    @override_settings(PRESTASHOP_API_KEY='cle')
+    def test_orders_read_from_payload(self):
+        rows = self.fetch({'orders': [{'reference': 'PS-1', 'associations': {'order_rows': [{}, {}]}}]})
+        self.assertEqual(rows, [{'reference': 'PS-1', 'cart_number': '', 'line_count': 2}])
+    
+    @override_settings(PRESTASHOP_API_KEY='cle')
+    def test_empty_list_means_no_orders(self):
+        self.assertEqual(self.fetch([]), [])
+    
+    @override_settings(PRESTASHOP_API_KEY='')
+    def test_missing_api_key(self):
+        with self.assertRaises(ImportSourceError):
+            self.fetch({'orders': []})
+
+
+class SiteReferenceTests(OrderTestCase):
+    """Une référence est unique dans son site, pas entre les sites d'une même base"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.lyon_agent = User.objects.create_user('lyon', password='p', role='AGENT', site='lyon')
+        cls.paris_agent = User.objects.create_user('paris', password='p', role='AGENT', site='paris')
+    
+    def jwt_client(self, user):
+        # Le site courant n'est fixé que par l'authentification JWT
+        client = APIClient(HTTP_HOST='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(user).access_token}')
+        return client
+    
+    def create(self, user, reference='CMD-1'):
+        return self.jwt_client(user).post('/api/orders/', {'reference': reference, 'cart_number': 'C-1'})
+    
+    def test_same_reference_in_two_sites(self):
+        self.assertEqual(self.create(self.lyon_agent).status_code, 201)
+        self.assertEqual(self.create(self.paris_agent).status_code, 201)
+        
+        response = self.create(self.lyon_agent)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reference', response.json())
+        self.assertEqual(Order.all_sites.filter(reference='CMD-1').count(), 2)
+    
+    def test_archived_reference_taken_in_its_site(self):
+        order = self.create_order('CMD-1', site='lyon', status='PACKED')
+        Order.all_sites.filter(pk=order.pk).update(packed_at=timezone.now() - timedelta(days=200))
+        self.assertEqual(archive_orders(days=90), 1)
+        self.assertEqual(self.create(self.lyon_agent).status_code, 400)
+        self.assertEqual(self.create(self.paris_agent).status_code, 201)
+    
+    def test_import_checks_own_site(self):
+        self.create_order('CMD-1', site='lyon')
+        with use_site('paris'):
+            summary = import_orders([{'reference': 'CMD-1'}, {'reference': 'CMD-2'}], self.paris_agent)
+        self.assertEqual(summary['created_count'], 2)
+        with use_site('lyon'):
+            summary = import_orders([{'reference': 'CMD-1'}, {'reference': 'CMD-2'}], self.lyon_agent)
+        self.assertEqual((summary['created_count'], summary['existing_count']), (1, 1))
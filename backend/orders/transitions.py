@@ -0,0 +1,94 @@
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+
+from order_management.db_routers import mark_recent_write
+from order_management.metrics import ORDER_TRANSITIONS, update_queue_depth
+from order_management.sites import site_database
+from .models import OrderEvent
+
+
+def record_transition(order, from_status, user, update_fields, timestamp=None):
+    """
+    Enregistre une commande déjà modifiée en mémoire et, si son statut a
+    changé, l'événement correspondant dans le journal, le tout dans une
+    même transaction.
+    
+    Retourne False si la commande a été modifiée par une autre requête
+    depuis sa lecture (rien n'est alors écrit).
+    """
+    database = site_database()
+    with transaction.atomic(using=database):
+        if not order.save_if_unchanged(update_fields):
+            return False
+        if order.status != from_status:
+            OrderEvent.objects.create(
+                order=order,
+                from_status=from_status,
+                to_status=order.status,
+                user=user,
+                timestamp=timestamp or timezone.now()
+            )
+            transaction.on_commit(partial(ORDER_TRANSITIONS.inc, from_status, order.status), using=database)
+            update_queue_depth(from_status, order.status)
+        # Reporting de l'utilisateur relu sur `default` le temps que la réplique rattrape,
+        # y compris après une modification sans changement de statut
+        transaction.on_commit(partial(mark_recent_write, user), using=database)
+    return True
+
+
+# Étapes du flux : statut attendu, statut atteint, utilisateur et horodatages renseignés
+STAGES = {
+    'prepare': {
+        'from_status': 'CREATED',
+        'to_status': 'PREPARED',
+        'user_field': 'preparer',
+        'timestamp_fields': ('prepared_at',),
+    },
+    'control': {
+        'from_status': 'PREPARED',
+        'to_status': 'CONTROLLED',
+        'user_field': 'controller',
+        'timestamp_fields': ('controlled_at',),
+    },
+    'pack': {
+        'from_status': 'CONTROLLED',
+        'to_status': 'PACKED',
+        'user_field': 'packer',
+        'timestamp_fields': ('packed_at', 'completed_at'),
+    },
+}
+
+# Ordre des statuts dans le flux, pour savoir si une commande est en retard sur une étape
+STATUS_ORDER = ('CREATED', 'PREPARED', 'CONTROLLED', 'PACKED')
+
+# Statuts de fin de flux : la commande n'attend plus aucune étape
+TERMINAL_STATUSES = ('PACKED', 'COMPLETED')
+
+
+def advance_order(order, stage, user, timestamp=None, extra_fields=()):
+    """
+    Fait passer une commande (dans le statut attendu par `stage`) à l'étape
+    suivante. `extra_fields` liste les champs déjà modifiés en mémoire à
+    enregistrer en même temps (par exemple `line_count` à la préparation).
+    
+    Retourne False en cas de conflit de version.
+    """
+    definition = STAGES[stage]
+    timestamp = timestamp or timezone.now()
+    
+    order.status = definition['to_status']
+    setattr(order, definition['user_field'], user)
+    for field in definition['timestamp_fields']:
+        setattr(order, field, timestamp)
+    
+    # La validation libère la réservation éventuelle de la commande
+    order.claimed_by = None
+    order.claimed_until = None
+    
+    update_fields = [
+        'status', definition['user_field'], *definition['timestamp_fields'],
+        'claimed_by', 'claimed_until', *extra_fields
+    ]
+    return record_transition(order, definition['from_status'], user, update_fields, timestamp)
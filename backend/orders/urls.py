@@ -1,33 +1,81 @@
+from django.conf import settings
 from django.urls import path
 from .views_date_range import OrderListCreateView
 from .views import (
     OrderDetailView, PreparationView, ControlView, PackingView,
-    DashboardView, OrderReferenceView, OrderBulkDeleteView
+    DashboardView, OrderReferenceView, OrderBulkDeleteView, ThroughputView,
+    OrderSearchView, CartView, ClaimNextOrderView, OrderReleaseView,
+    BacklogView
 )
 from .presta_views import PrestaOrdersView
+from .views_sync import OrderSyncView
+from .views_import import OrderImportView
+from .views_diagnostics import SlowQueryLogView, ProfileTokenView, ProfileFileView
+from .async_views import (
+    AsyncPreparationListView, AsyncControlListView, AsyncPackingListView,
+    AsyncDashboardView, AsyncOrderReferenceView, AsyncPrestaOrdersView
+)
+
+# Vues en lecture servies en asynchrone (ASGI) ou par les vues synchrones d'origine
+if settings.ASYNC_READ_VIEWS:
+    PreparationReadView, ControlReadView, PackingReadView = (
+        AsyncPreparationListView, AsyncControlListView, AsyncPackingListView
+    )
+    DashboardReadView, ReferenceReadView, PrestaReadView = (
+        AsyncDashboardView, AsyncOrderReferenceView, AsyncPrestaOrdersView
+    )
+else:
+    PreparationReadView, ControlReadView, PackingReadView = PreparationView, ControlView, PackingView
+    DashboardReadView, ReferenceReadView, PrestaReadView = DashboardView, OrderReferenceView, PrestaOrdersView
 
 urlpatterns = [
     # Basic order management
     path('', OrderListCreateView.as_view(), name='order-list-create'),
     path('<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
-    path('reference/<str:reference>/', OrderReferenceView.as_view(), name='order-by-reference'),
+    path('reference/<str:reference>/', ReferenceReadView.as_view(), name='order-by-reference'),
+    path('search/', OrderSearchView.as_view(), name='order-search'),
+    path('cart/<str:cart_number>/', CartView.as_view(), name='order-cart'),
     
     # Module-specific endpoints
-    path('preparation/', PreparationView.as_view(), name='preparation-list'),
+    path('preparation/', PreparationReadView.as_view(), name='preparation-list'),
     path('<int:pk>/prepare/', PreparationView.as_view(), name='preparation-validate'),
     
-    path('control/', ControlView.as_view(), name='control-list'),
+    path('control/', ControlReadView.as_view(), name='control-list'),
     path('<int:pk>/control/', ControlView.as_view(), name='control-validate'),
     
-    path('packing/', PackingView.as_view(), name='packing-list'),
+    path('packing/', PackingReadView.as_view(), name='packing-list'),
     path('<int:pk>/pack/', PackingView.as_view(), name='packing-validate'),
     
+    # Every order not yet packed, whatever its creation date
+    path('backlog/', BacklogView.as_view(), name='order-backlog'),
+    
+    # Work dispatch: claim the next available order of a stage
+    path('preparation/claim/', ClaimNextOrderView.as_view(), {'stage': 'prepare'}, name='preparation-claim'),
+    path('control/claim/', ClaimNextOrderView.as_view(), {'stage': 'control'}, name='control-claim'),
+    path('packing/claim/', ClaimNextOrderView.as_view(), {'stage': 'pack'}, name='packing-claim'),
+    path('<int:pk>/release/', OrderReleaseView.as_view(), name='order-release'),
+    
+    # Batch upload of scans recorded offline by mobile stations
+    path('sync/', OrderSyncView.as_view(), name='order-sync'),
+    
+    # Bulk import from CSV or PrestaShop (manager only)
+    path('import/', OrderImportView.as_view(), name='order-import'),
+    
     # Bulk delete orders (manager only)
     path('delete/', OrderBulkDeleteView.as_view(), name='order-bulk-delete'),
     
     # Dashboard for managers
-    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('dashboard/', DashboardReadView.as_view(), name='dashboard'),
+    path('throughput/', ThroughputView.as_view(), name='throughput'),
+    
+    # Slow SQL query log (manager only)
+    path('diagnostics/slow-queries/', SlowQueryLogView.as_view(), name='slow-queries'),
+    
+    # On-demand request profiling (manager only)
+    path('diagnostics/profile-token/', ProfileTokenView.as_view(), name='profile-token'),
+    path('diagnostics/profiles/', ProfileFileView.as_view(), name='profile-list'),
+    path('diagnostics/profiles/<str:filename>/', ProfileFileView.as_view(), name='profile-file'),
     
     # PrestaShop orders (manager only)
-    path('presta-orders/', PrestaOrdersView.as_view(), name='presta-orders'),
+    path('presta-orders/', PrestaReadView.as_view(), name='presta-orders'),
 ]
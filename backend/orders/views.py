@@ -1,13 +1,22 @@
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
-from datetime import timedelta
+from datetime import timedelta, timezone as dt_timezone
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Order
-from .serializers import OrderSerializer, OrderCreateSerializer, OrderUpdateSerializer
+from .models import Order, ArchivedOrder
+from .serializers import OrderSerializer, OrderCreateSerializer, OrderUpdateSerializer, serialize_order_list
+from .transitions import record_transition, advance_order, STAGES, STATUS_ORDER, TERMINAL_STATUSES
+from .dispatch import claim_next_order, release_order, CLAIM_ORDERINGS
+from .idempotency import idempotent
 from authentication.models import User
+from order_management.db_routers import ReplicaReadMixin, mark_recent_write
+from order_management.metrics import update_queue_depth
+from order_management.sites import site_database
+from django.db import connection, transaction
 from django.db.models import Q, Count
+from django.db.models.functions import TruncHour, TruncMinute
+from .archive import archive_may_contain
 from rest_framework.decorators import permission_classes
 
 # Importer le gestionnaire de plages de dates
@@ -15,6 +24,35 @@ import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from date_range_handler import get_date_range
 
+def expected_version_conflict(request, order):
+    """
+    Retourne une réponse 409 si le client a transmis la version de la commande
+    qu'il a affichée et que celle-ci n'est plus à jour.
+    """
+    expected_version = request.data.get('version')
+    if expected_version is None:
+        return None
+    try:
+        expected_version = int(expected_version)
+    except (ValueError, TypeError):
+        return Response({"error": "La version doit être un entier"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if expected_version != order.version:
+        return version_conflict_response(order)
+    return None
+
+def version_conflict_response(order):
+    """Réponse renvoyée quand une autre requête a modifié la commande entre-temps"""
+    return Response({
+        "error": "Cette commande a été modifiée par un autre utilisateur, veuillez réessayer",
+        "version": Order.objects.filter(pk=order.pk).values_list('version', flat=True).first()
+    }, status=status.HTTP_409_CONFLICT)
+
+def claimed_by_other_response():
+    """Réponse renvoyée quand la commande est réservée par un autre agent"""
+    return Response({"error": "Cette commande est réservée par un autre agent"},
+                    status=status.HTTP_409_CONFLICT)
+
 # Create your views here.
 class OrderListCreateView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
@@ -96,11 +134,22 @@ class OrderDetailView(APIView):
         if not (request.user.is_manager() or request.user.is_super_agent()) and request.user != order.creator:
             return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
         
+        conflict = expected_version_conflict(request, order)
+        if conflict:
+            return conflict
+        
         serializer = OrderUpdateSerializer(order, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        updated_order = serializer.save()
         
-        return Response(OrderSerializer(updated_order).data)
+        # N'écrire que les champs modifiés, et seulement si personne d'autre
+        # n'a modifié la commande depuis sa lecture
+        previous_status = order.status
+        for field, value in serializer.validated_data.items():
+            setattr(order, field, value)
+        if not record_transition(order, previous_status, request.user, list(serializer.validated_data)):
+            return version_conflict_response(order)
+        
+        return Response(OrderSerializer(order).data)
     
     def delete(self, request, pk):
         order = self.get_order(pk)
@@ -110,6 +159,8 @@ class OrderDetailView(APIView):
             return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
         
         order.delete()
+        update_queue_depth(from_status=order.status)
+        mark_recent_write(request.user)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 class PreparationView(APIView):
@@ -158,9 +209,10 @@ class PreparationView(APIView):
                 created_at__lt=end_datetime
             ).order_by('-created_at')
         
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        # ?format=compact|columnar : utilisateurs envoyés une seule fois
+        return Response(serialize_order_list(orders, request.query_params.get('format')))
     
+    @idempotent
     def post(self, request, pk):
         order = get_object_or_404(Order, pk=pk)
         
@@ -169,6 +221,13 @@ class PreparationView(APIView):
             return Response({"error": "Cette commande n'est pas en attente de préparation"}, 
                            status=status.HTTP_400_BAD_REQUEST)
         
+        conflict = expected_version_conflict(request, order)
+        if conflict:
+            return conflict
+        
+        if order.is_claimed_by_other(request.user):
+            return claimed_by_other_response()
+        
         # Get line_count from request data
         line_count = request.data.get('line_count')
         if line_count is not None:
@@ -183,10 +242,8 @@ class PreparationView(APIView):
                                status=status.HTTP_400_BAD_REQUEST)
         
         # Update order status and preparer
-        order.status = 'PREPARED'
-        order.preparer = request.user
-        order.prepared_at = timezone.now()
-        order.save()
+        if not advance_order(order, 'prepare', request.user, extra_fields=['line_count']):
+            return version_conflict_response(order)
         
         return Response(OrderSerializer(order).data)
 
@@ -223,9 +280,10 @@ class ControlView(APIView):
             created_at__lt=end_datetime
         ).order_by('-created_at')
         
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        # ?format=compact|columnar : utilisateurs envoyés une seule fois
+        return Response(serialize_order_list(orders, request.query_params.get('format')))
     
+    @idempotent
     def post(self, request, pk):
         order = get_object_or_404(Order, pk=pk)
         
@@ -234,11 +292,16 @@ class ControlView(APIView):
             return Response({"error": "Cette commande n'est pas en attente de contrôle"}, 
                            status=status.HTTP_400_BAD_REQUEST)
         
+        conflict = expected_version_conflict(request, order)
+        if conflict:
+            return conflict
+        
+        if order.is_claimed_by_other(request.user):
+            return claimed_by_other_response()
+        
         # Update order status and controller
-        order.status = 'CONTROLLED'
-        order.controller = request.user
-        order.controlled_at = timezone.now()
-        order.save()
+        if not advance_order(order, 'control', request.user):
+            return version_conflict_response(order)
         
         return Response(OrderSerializer(order).data)
 
@@ -275,9 +338,10 @@ class PackingView(APIView):
             created_at__lt=end_datetime
         ).order_by('-created_at')
         
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        # ?format=compact|columnar : utilisateurs envoyés une seule fois
+        return Response(serialize_order_list(orders, request.query_params.get('format')))
     
+    @idempotent
     def post(self, request, pk):
         order = get_object_or_404(Order, pk=pk)
         
@@ -286,15 +350,52 @@ class PackingView(APIView):
             return Response({"error": "Cette commande n'est pas en attente d'emballage"}, 
                            status=status.HTTP_400_BAD_REQUEST)
         
+        conflict = expected_version_conflict(request, order)
+        if conflict:
+            return conflict
+        
+        if order.is_claimed_by_other(request.user):
+            return claimed_by_other_response()
+        
         # Update order status and packer
-        order.status = 'PACKED'
-        order.packer = request.user
-        order.packed_at = timezone.now()
-        order.completed_at = timezone.now()
-        order.save()
+        if not advance_order(order, 'pack', request.user):
+            return version_conflict_response(order)
         
         return Response(OrderSerializer(order).data)
 
+class BacklogView(APIView):
+    """
+    Toutes les commandes non emballées, quelle que soit leur date de
+    création (les listes des modules ne montrent que celles du jour).
+    Paramètre optionnel `status` : CREATED, PREPARED ou CONTROLLED.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    ACTIVE_STATUSES = ('CREATED', 'PREPARED', 'CONTROLLED')
+    
+    def get(self, request):
+        # La condition doit rester identique à celle de l'index partiel
+        # order_active_status_idx pour que la base puisse l'utiliser
+        orders = Order.objects.exclude(status='PACKED')
+        
+        status_param = request.query_params.get('status')
+        if status_param:
+            if status_param not in self.ACTIVE_STATUSES:
+                return Response({"error": "Statut invalide (CREATED, PREPARED ou CONTROLLED)"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            orders = orders.filter(status=status_param)
+        
+        # Comme dans le module Préparation, un agent ne voit que les
+        # commandes à préparer qu'il a créées
+        if not request.user.is_manager():
+            orders = orders.filter(~Q(status='CREATED') | Q(creator=request.user))
+        
+        # Tri dans l'ordre de l'index (par statut, puis plus anciennes d'abord)
+        orders = orders.select_related('creator', 'preparer', 'controller', 'packer').order_by('status', 'created_at')
+        
+        serializer = OrderSerializer(orders, many=True)
+        return Response(serializer.data)
+
 class OrderReferenceView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
     
@@ -312,6 +413,186 @@ class OrderReferenceView(APIView):
         except Order.DoesNotExist:
             return Response({"error": "Commande non trouvée"}, status=status.HTTP_404_NOT_FOUND)
 
+def prefix_filter(field, prefix):
+    """
+    Filtre « commence par » pouvant utiliser l'index du champ.
+    
+    PostgreSQL utilise LIKE 'prefix%' avec les index text_pattern_ops.
+    Sur SQLite, LIKE est insensible à la casse et ne peut pas utiliser
+    l'index : on utilise une comparaison de bornes équivalente.
+    """
+    if connection.vendor == 'postgresql':
+        return Q(**{f'{field}__startswith': prefix})
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\U0010ffff'})
+
+class OrderSearchView(APIView):
+    """
+    Recherche incrémentale par début de référence ou de numéro de chariot,
+    pour la barre de recherche et la lecture partielle de codes-barres.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    DEFAULT_LIMIT = 10
+    MAX_LIMIT = 50
+    RESULT_FIELDS = ('id', 'reference', 'cart_number', 'status', 'created_at')
+    
+    def get(self, request):
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            return Response([])
+        
+        try:
+            limit = min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "La limite doit être un entier"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"error": "La limite doit être un entier positif"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if request.user.is_manager() or request.user.is_super_agent():
+            query = Order.objects.all()
+        else:
+            # Agents can only find orders they created
+            query = Order.objects.filter(creator=request.user)
+        
+        # Deux parcours d'index bornés par la limite : références d'abord, puis chariots
+        results = list(
+            query.filter(prefix_filter('reference', term))
+            .order_by('reference')
+            .values(*self.RESULT_FIELDS)[:limit]
+        )
+        if len(results) < limit:
+            found_ids = [result['id'] for result in results]
+            results += list(
+                query.filter(prefix_filter('cart_number', term))
+                .exclude(id__in=found_ids)
+                .order_by('cart_number', 'reference')
+                .values(*self.RESULT_FIELDS)[:limit - len(results)]
+            )
+        
+        # Même format de date que OrderSerializer (fuseau local)
+        for result in results:
+            result['created_at'] = timezone.localtime(result['created_at'])
+        
+        return Response(results)
+
+class CartView(APIView):
+    """
+    Commandes en cours (ni emballées, ni terminées) d'un chariot, avec le nombre de
+    commandes par statut. Le POST fait passer en une seule transaction
+    toutes les commandes du chariot à l'étape demandée.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    def get_open_orders(self, cart_number):
+        return list(
+            Order.objects.filter(cart_number=cart_number)
+            .exclude(status__in=TERMINAL_STATUSES)
+            .select_related('creator', 'preparer', 'controller', 'packer')
+            .order_by('created_at')
+        )
+    
+    def get(self, request, cart_number):
+        orders = self.get_open_orders(cart_number)
+        
+        counts = {order_status: 0 for order_status in STATUS_ORDER if order_status not in TERMINAL_STATUSES}
+        for order in orders:
+            counts[order.status] = counts.get(order.status, 0) + 1
+        
+        return Response({
+            'cart_number': cart_number,
+            'counts': counts,
+            'orders': OrderSerializer(orders, many=True).data
+        })
+    
+    @idempotent
+    def post(self, request, cart_number):
+        stage = request.data.get('stage')
+        if stage not in STAGES:
+            return Response({"error": "Étape invalide (prepare, control ou pack)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        from_status = STAGES[stage]['from_status']
+        
+        orders = self.get_open_orders(cart_number)
+        
+        # Les commandes déjà passées par cette étape sont ignorées, celles
+        # qui ne l'ont pas encore atteinte bloquent la validation du chariot
+        not_ready = [
+            order.reference for order in orders
+            if STATUS_ORDER.index(order.status) < STATUS_ORDER.index(from_status)
+        ]
+        if not_ready:
+            return Response({
+                "error": "Certaines commandes du chariot ne sont pas prêtes pour cette étape",
+                "references": not_ready
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        to_advance = [order for order in orders if order.status == from_status]
+        if not to_advance:
+            return Response({"error": "Aucune commande du chariot n'est en attente de cette étape"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        if any(order.is_claimed_by_other(request.user) for order in to_advance):
+            return claimed_by_other_response()
+        
+        timestamp = timezone.now()
+        try:
+            with transaction.atomic(using=site_database()):
+                for order in to_advance:
+                    if not advance_order(order, stage, request.user, timestamp):
+                        raise CartConflict(order)
+        except CartConflict as conflict:
+            return version_conflict_response(conflict.order)
+        
+        return Response({
+            'cart_number': cart_number,
+            'advanced_count': len(to_advance),
+            'orders': OrderSerializer(to_advance, many=True).data
+        })
+
+class ClaimNextOrderView(APIView):
+    """
+    Réserve la prochaine commande disponible pour une étape, afin que
+    plusieurs agents d'un même poste ne traitent pas la même commande.
+    Paramètre optionnel `policy` : age (défaut), line_count ou -line_count.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    def post(self, request, stage):
+        policy = request.data.get('policy') or request.query_params.get('policy', 'age')
+        if policy not in CLAIM_ORDERINGS:
+            return Response({"error": "Politique d'attribution invalide (age, line_count ou -line_count)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        order = claim_next_order(stage, request.user, policy)
+        if order is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        mark_recent_write(request.user)
+        
+        return Response(OrderSerializer(order).data)
+
+class OrderReleaseView(APIView):
+    """Libère la réservation d'une commande par l'agent qui la détient"""
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    def post(self, request, pk):
+        order = get_object_or_404(Order, pk=pk)
+        
+        if order.claimed_by_id != request.user.id and not request.user.is_manager():
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        
+        if not release_order(order):
+            return version_conflict_response(order)
+        mark_recent_write(request.user)
+        
+        return Response(OrderSerializer(order).data)
+
+class CartConflict(Exception):
+    """Une commande du chariot a été modifiée pendant la validation groupée"""
+    
+    def __init__(self, order):
+        super().__init__(order.reference)
+        self.order = order
+
 class OrderBulkDeleteView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
     
@@ -332,9 +613,12 @@ class OrderBulkDeleteView(APIView):
             try:
                 order = Order.objects.get(pk=order_id)
                 order.delete()
+                update_queue_depth(from_status=order.status)
                 deleted_count += 1
             except Order.DoesNotExist:
                 pass
+        if deleted_count:
+            mark_recent_write(request.user)
         
         return Response({
             "message": f"{deleted_count} commande(s) supprimée(s) avec succès",
@@ -342,7 +626,7 @@ class OrderBulkDeleteView(APIView):
         })
 
 
-class DashboardView(APIView):
+class DashboardView(ReplicaReadMixin, APIView):
     permission_classes = (permissions.IsAuthenticated,)
     
     def get(self, request):
@@ -372,36 +656,38 @@ class DashboardView(APIView):
         start_datetime = timezone.make_aware(timezone.datetime.combine(start_date, timezone.datetime.min.time()))
         end_datetime = timezone.make_aware(timezone.datetime.combine(end_date, timezone.datetime.min.time()))
         
-        # Get counts of orders by status for the specified date
-        total_orders = Order.objects.filter(
-            created_at__gte=start_datetime,
-            created_at__lt=end_datetime
-        ).count()
+        # Les journées anciennes comptent aussi les commandes archivées
+        models_to_query = [Order]
+        if archive_may_contain(start_datetime):
+            models_to_query.append(ArchivedOrder)
         
-        in_progress_orders = Order.objects.filter(
-            created_at__gte=start_datetime,
-            created_at__lt=end_datetime
-        ).exclude(status='PACKED').count()
-        
-        completed_orders = Order.objects.filter(
-            created_at__gte=start_datetime,
-            created_at__lt=end_datetime,
-            status='PACKED'
-        ).count()
+        # Get counts of orders by status for the specified date
+        day_filter = {'created_at__gte': start_datetime, 'created_at__lt': end_datetime}
+        total_orders = sum(model.objects.filter(**day_filter).count() for model in models_to_query)
+        in_progress_orders = sum(
+            model.objects.filter(**day_filter).exclude(status='PACKED').count() for model in models_to_query
+        )
+        completed_orders = sum(
+            model.objects.filter(status='PACKED', **day_filter).count() for model in models_to_query
+        )
         
         # Calculate average times for orders completed today
-        all_orders = Order.objects.filter(
-            status='PACKED',
-            packed_at__gte=start_datetime,
-            packed_at__lt=end_datetime
-        )
+        all_orders = [
+            order
+            for model in models_to_query
+            for order in model.objects.filter(
+                status='PACKED',
+                packed_at__gte=start_datetime,
+                packed_at__lt=end_datetime
+            )
+        ]
         
         avg_preparation_time = 0
         avg_control_time = 0
         avg_packing_time = 0
         avg_total_time = 0
         
-        if all_orders.exists():
+        if all_orders:
             preparation_times = [order.preparation_time() for order in all_orders if order.preparation_time() is not None]
             control_times = [order.control_time() for order in all_orders if order.control_time() is not None]
             packing_times = [order.packing_time() for order in all_orders if order.packing_time() is not None]
@@ -421,10 +707,11 @@ class DashboardView(APIView):
         agent_stats = []
         
         for agent in agents:
-            created_count = Order.objects.filter(creator=agent).count()
-            prepared_count = Order.objects.filter(preparer=agent).count()
-            controlled_count = Order.objects.filter(controller=agent).count()
-            packed_count = Order.objects.filter(packer=agent).count()
+            # Les compteurs portent sur tout l'historique, archive comprise
+            created_count = Order.objects.filter(creator=agent).count() + ArchivedOrder.objects.filter(creator=agent).count()
+            prepared_count = Order.objects.filter(preparer=agent).count() + ArchivedOrder.objects.filter(preparer=agent).count()
+            controlled_count = Order.objects.filter(controller=agent).count() + ArchivedOrder.objects.filter(controller=agent).count()
+            packed_count = Order.objects.filter(packer=agent).count() + ArchivedOrder.objects.filter(packer=agent).count()
             
             agent_stats.append({
                 'id': agent.id,
@@ -452,3 +739,83 @@ class DashboardView(APIView):
             },
             'agent_stats': agent_stats
         })
+
+
+class ThroughputView(ReplicaReadMixin, APIView):
+    """
+    Nombre de commandes créées, préparées, contrôlées et emballées par
+    tranche horaire (ou de 15/30 minutes) sur une journée ou une semaine.
+    Accessible uniquement aux managers.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    # Nom de la série -> horodatage de l'étape
+    STAGE_FIELDS = (
+        ('created', 'created_at'),
+        ('prepared', 'prepared_at'),
+        ('controlled', 'controlled_at'),
+        ('packed', 'packed_at'),
+    )
+    # Intervalle -> durée en minutes
+    INTERVALS = {'hour': 60, '30min': 30, '15min': 15}
+    
+    def get(self, request):
+        # Only managers can access throughput statistics
+        if not request.user.is_manager():
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        
+        interval = request.query_params.get('interval', 'hour')
+        if interval not in self.INTERVALS:
+            return Response({"error": "Intervalle invalide (hour, 30min ou 15min)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        minutes = self.INTERVALS[interval]
+        
+        # 'today' (défaut), 'week', 'month' ou YYYY-MM-DD
+        start_datetime, end_datetime = get_date_range(request.query_params.get('date', 'today'))
+        
+        models_to_query = [Order]
+        if archive_may_contain(start_datetime):
+            models_to_query.append(ArchivedOrder)
+        
+        # Agrégation en base : au plus une ligne par heure (ou minute) et par étape.
+        # Les tranches de moins d'une heure sont regroupées ensuite en Python.
+        truncate = TruncHour if minutes == 60 else TruncMinute
+        counts = {}
+        for name, field in self.STAGE_FIELDS:
+            for model in models_to_query:
+                rows = (
+                    model.objects
+                    .filter(**{f'{field}__gte': start_datetime, f'{field}__lt': end_datetime})
+                    .annotate(bucket=truncate(field))
+                    .values('bucket')
+                    .annotate(count=Count('id'))
+                    .order_by()
+                )
+                for row in rows:
+                    bucket = row['bucket'].astimezone(dt_timezone.utc)
+                    bucket = bucket.replace(minute=bucket.minute - bucket.minute % minutes)
+                    bucket_counts = counts.setdefault(bucket, self._empty_counts())
+                    bucket_counts[name] += row['count']
+        
+        # Série complète, y compris les tranches sans activité
+        series = []
+        step = timedelta(minutes=minutes)
+        bucket = start_datetime.astimezone(dt_timezone.utc)
+        end_utc = end_datetime.astimezone(dt_timezone.utc)
+        while bucket < end_utc:
+            bucket_counts = counts.get(bucket) or self._empty_counts()
+            series.append({
+                'start': timezone.localtime(bucket).isoformat(),
+                **bucket_counts
+            })
+            bucket += step
+        
+        return Response({
+            'start': start_datetime.isoformat(),
+            'end': end_datetime.isoformat(),
+            'interval': interval,
+            'series': series
+        })
+    
+    def _empty_counts(self):
+        return {name: 0 for name, field in self.STAGE_FIELDS}
@@ -1,17 +1,23 @@
+from django.db import IntegrityError
 from django.shortcuts import render, get_object_or_404
 from django.utils import timezone
 from datetime import timedelta
+import math
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Order
-from .serializers import OrderSerializer, OrderCreateSerializer, OrderUpdateSerializer
+from .models import Order, ArchivedOrder
+from .archive import archive_may_contain
+from .idempotency import idempotent
+from .views import prefix_filter
+from .serializers import OrderSerializer, OrderCreateSerializer, OrderUpdateSerializer, serialize_order_list, COMPACT_FORMATS
 from authentication.models import User
-from django.db.models import Q, Count
+from order_management.db_routers import ReplicaReadMixin
+from django.db.models import Q, Count, F, ExpressionWrapper, DurationField
 from rest_framework.decorators import permission_classes
 
 # Vue pour gérer les commandes avec filtrage par plage de dates
-class OrderListCreateView(APIView):
+class OrderListCreateView(ReplicaReadMixin, APIView):
     permission_classes = (permissions.IsAuthenticated,)
     
     def get(self, request):
@@ -79,54 +85,238 @@ class OrderListCreateView(APIView):
         
         # Si le paramètre est 'all', ne pas filtrer par date
         # Suppression de la condition "and not (start_date_param or end_date_param)" qui empêchait le traitement correct du paramètre 'all'
+        filters = {}
+        start_datetime = None
         if date_param == 'all':
             print("Paramètre 'all' détecté: aucun filtrage par date ne sera appliqué")
-            # Préparer la requête sans filtre de date
-            if request.user.is_manager() or request.user.is_super_agent():
-                query = Order.objects.all()
-                
-                # Filtrer par créateur si spécifié
-                if creator_id:
-                    query = query.filter(creator_id=creator_id)
-                    print(f"Filtrage par créateur: {creator_id}")
-                    
-                orders = query.order_by('-created_at')
-                print(f"Nombre total de commandes récupérées: {orders.count()}")
-            else:
-                # Agents can see orders they created
-                orders = Order.objects.filter(creator=request.user).order_by('-created_at')
-                print(f"Nombre de commandes de l'agent: {orders.count()}")
         else:
             # Convertir les dates en datetime avec timezone
             start_datetime = timezone.make_aware(timezone.datetime.combine(start_date, timezone.datetime.min.time()))
             end_datetime = timezone.make_aware(timezone.datetime.combine(end_date, timezone.datetime.min.time()))
             
             # Filtrer les commandes par date de création
-            if request.user.is_manager() or request.user.is_super_agent():
-                query = Order.objects.filter(
-                    created_at__gte=start_datetime,
-                    created_at__lt=end_datetime
-                )
-                
-                # Filtrer par créateur si spécifié
-                if creator_id:
-                    query = query.filter(creator_id=creator_id)
-                    
-                orders = query.order_by('-created_at')
+            filters['created_at__gte'] = start_datetime
+            filters['created_at__lt'] = end_datetime
+        
+        if request.user.is_manager() or request.user.is_super_agent():
+            # Filtrer par créateur si spécifié
+            if creator_id:
+                filters['creator_id'] = creator_id
+        else:
+            # Agents can see orders they created
+            filters['creator'] = request.user
+        
+        try:
+            conditions = self.get_filter_conditions(request)
+            ordering = self.get_ordering(request)
+            page, page_size, limit = self.get_pagination(request)
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        durations = self.get_used_durations(request, ordering)
+        orders = self.build_queryset(Order, filters, conditions, ordering, durations)
+        
+        # Les commandes archivées ne sont lues que si la période demandée
+        # remonte avant la date limite d'archivage
+        archived_orders = None
+        if archive_may_contain(start_datetime):
+            archived_orders = self.build_queryset(ArchivedOrder, filters, conditions, ordering, durations)
+        
+        # ?format=compact|columnar : utilisateurs envoyés une seule fois
+        payload_format = request.query_params.get('format')
+        
+        if page_size:
+            # Réponse paginée : seule la page demandée est lue en base
+            offset = (page - 1) * page_size
+            if archived_orders is None:
+                count = orders.count()
+                page_orders = orders[offset:offset + page_size]
+            else:
+                count = orders.count() + archived_orders.count()
+                page_orders = self.merge_orders(orders, archived_orders, ordering, offset + page_size)[offset:]
+            payload = serialize_order_list(page_orders, payload_format)
+            response = {
+                'count': count,
+                'page': page,
+                'page_size': page_size
+            }
+            if payload_format in COMPACT_FORMATS:
+                response.update(results=payload['orders'], users=payload['users'])
+            else:
+                response['results'] = payload
+            return Response(response)
+        
+        if archived_orders is not None:
+            orders = self.merge_orders(orders, archived_orders, ordering, limit)
+        elif limit:
+            orders = orders[:limit]
+        
+        return Response(serialize_order_list(orders, payload_format))
+    
+    # Durées filtrables et triables (en minutes) : début et fin de l'étape
+    DURATION_FIELDS = {
+        'preparation_time': ('created_at', 'prepared_at'),
+        'control_time': ('prepared_at', 'controlled_at'),
+        'packing_time': ('controlled_at', 'packed_at'),
+        'total_time': ('created_at', 'completed_at'),
+    }
+    
+    # Champs acceptés par le paramètre `ordering` (préfixe '-' pour l'ordre décroissant)
+    ORDERING_FIELDS = (
+        'created_at', 'prepared_at', 'controlled_at', 'packed_at', 'completed_at',
+        'reference', 'cart_number', 'status', 'line_count',
+        *DURATION_FIELDS,
+    )
+    
+    MAX_PAGE_SIZE = 500
+    
+    # Borne des filtres de durée (en minutes) : un an
+    MAX_DURATION_MINUTES = 366 * 24 * 60
+    
+    def get_filter_conditions(self, request):
+        """
+        Filtres optionnels du tableau des commandes, appliqués en base :
+        status (liste séparée par des virgules), preparer_id, controller_id,
+        packer_id, line_count_min/max, <durée>_min/max (en minutes) et search
+        (début de la référence).
+        """
+        params = request.query_params
+        conditions = Q()
+        
+        if params.get('status'):
+            statuses = [value.strip().upper() for value in params['status'].split(',') if value.strip()]
+            valid_statuses = [choice[0] for choice in Order.STATUS_CHOICES]
+            if any(value not in valid_statuses for value in statuses):
+                raise ValueError("Statut invalide")
+            conditions &= Q(status__in=statuses)
+        
+        for user_field in ('preparer', 'controller', 'packer'):
+            if params.get(f'{user_field}_id'):
+                conditions &= Q(**{f'{user_field}_id': self.parse_int(params[f'{user_field}_id'], f'{user_field}_id')})
+        
+        if params.get('line_count_min'):
+            conditions &= Q(line_count__gte=self.parse_int(params['line_count_min'], 'line_count_min'))
+        if params.get('line_count_max'):
+            conditions &= Q(line_count__lte=self.parse_int(params['line_count_max'], 'line_count_max'))
+        
+        for duration in self.DURATION_FIELDS:
+            if params.get(f'{duration}_min'):
+                minutes = self.parse_number(params[f'{duration}_min'], f'{duration}_min', self.MAX_DURATION_MINUTES)
+                conditions &= Q(**{f'{duration}_duration__gte': timedelta(minutes=minutes)})
+            if params.get(f'{duration}_max'):
+                minutes = self.parse_number(params[f'{duration}_max'], f'{duration}_max', self.MAX_DURATION_MINUTES)
+                conditions &= Q(**{f'{duration}_duration__lte': timedelta(minutes=minutes)})
+        
+        if params.get('search'):
+            # Début de la référence, comme la recherche incrémentale (index utilisable)
+            conditions &= prefix_filter('reference', params['search'].strip())
+        
+        return conditions
+    
+    def get_ordering(self, request):
+        """Tri multi-colonnes, par exemple `ordering=status,-line_count` (défaut : -created_at)"""
+        ordering = [field.strip() for field in request.query_params.get('ordering', '').split(',') if field.strip()]
+        for field in ordering:
+            if field.lstrip('-') not in self.ORDERING_FIELDS:
+                raise ValueError(f"Tri invalide: {field}")
+        # L'identifiant départage les égalités pour une pagination stable
+        return ordering + ['-created_at', '-id'] if ordering else ['-created_at', '-id']
+    
+    def get_pagination(self, request):
+        params = request.query_params
+        page = self.parse_int(params.get('page', 1), 'page')
+        page_size = self.parse_int(params['page_size'], 'page_size') if params.get('page_size') else None
+        limit = self.parse_int(params['limit'], 'limit') if params.get('limit') else None
+        if page < 1 or (page_size is not None and not 1 <= page_size <= self.MAX_PAGE_SIZE):
+            raise ValueError(f"Pagination invalide (page >= 1, page_size entre 1 et {self.MAX_PAGE_SIZE})")
+        if limit is not None and limit < 1:
+            raise ValueError("La limite doit être un entier positif")
+        return page, page_size, limit
+    
+    def get_used_durations(self, request, ordering):
+        """Durées à calculer en base : celles qui servent au filtre ou au tri"""
+        params = request.query_params
+        sorted_fields = [field.lstrip('-') for field in ordering]
+        return [
+            duration for duration in self.DURATION_FIELDS
+            if params.get(f'{duration}_min') or params.get(f'{duration}_max') or duration in sorted_fields
+        ]
+    
+    def build_queryset(self, model, filters, conditions, ordering, durations):
+        annotations = {}
+        for duration in durations:
+            start, end = self.DURATION_FIELDS[duration]
+            annotations[f'{duration}_duration'] = ExpressionWrapper(F(end) - F(start), output_field=DurationField())
+        order_by = []
+        for field in ordering:
+            name = field.lstrip('-')
+            expression = F(f'{name}_duration' if name in self.DURATION_FIELDS else name)
+            # Valeurs vides en dernier, comme sort_orders, quel que soit le moteur
+            if field.startswith('-'):
+                order_by.append(expression.desc(nulls_last=True))
+            else:
+                order_by.append(expression.asc(nulls_last=True))
+        return (
+            model.objects
+            .filter(**filters)
+            .annotate(**annotations)
+            .filter(conditions)
+            .select_related('creator', 'preparer', 'controller', 'packer')
+            .order_by(*order_by)
+        )
+    
+    def merge_orders(self, orders, archived_orders, ordering, window=None):
+        """
+        Fusionne les commandes actives et archivées triées en base : chaque
+        table ne fournit que ses `window` premières lignes (toutes si None),
+        ce qui suffit pour les `window` premières lignes de l'ensemble.
+        """
+        if window is not None:
+            orders, archived_orders = orders[:window], archived_orders[:window]
+        return self.sort_orders(list(orders) + list(archived_orders), ordering)[:window]
+    
+    def sort_orders(self, orders, ordering):
+        """Tri en Python des commandes actives et archivées fusionnées (valeurs vides en dernier)"""
+        for field in reversed(ordering):
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            if name in self.DURATION_FIELDS:
+                key = lambda order, name=name: getattr(order, name)()
             else:
-                # Agents can see orders they created
-                orders = Order.objects.filter(
-                    creator=request.user,
-                    created_at__gte=start_datetime,
-                    created_at__lt=end_datetime
-                ).order_by('-created_at')
-        
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+                key = lambda order, name=name: getattr(order, name)
+            present = [order for order in orders if key(order) is not None]
+            missing = [order for order in orders if key(order) is None]
+            orders = sorted(present, key=key, reverse=descending) + missing
+        return orders
+    
+    def parse_int(self, value, name):
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            raise ValueError(f"Le paramètre {name} doit être un entier")
+    
+    def parse_number(self, value, name, maximum=None):
+        try:
+            number = float(value)
+        except (ValueError, TypeError):
+            raise ValueError(f"Le paramètre {name} doit être un nombre")
+        # inf, nan ou valeur démesurée : timedelta() échouerait
+        if not math.isfinite(number):
+            raise ValueError(f"Le paramètre {name} doit être un nombre fini")
+        if maximum is not None and abs(number) > maximum:
+            raise ValueError(f"Le paramètre {name} ne peut pas dépasser {maximum} en valeur absolue")
+        return number
     
+    @idempotent
     def post(self, request):
         serializer = OrderCreateSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        order = serializer.save()
+        try:
+            order = serializer.save()
+        except IntegrityError:
+            # Deux créations simultanées de la même référence : la seconde
+            # passe la validation mais échoue sur la contrainte d'unicité
+            return Response({"reference": ["Une commande avec cette référence existe déjà."]},
+                            status=status.HTTP_400_BAD_REQUEST)
         
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
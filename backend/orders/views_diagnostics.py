@@ -0,0 +1,81 @@
+import os
+
+from django.conf import settings
+from django.http import FileResponse
+from rest_framework import status, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from order_management.profiling import make_profile_token
+from order_management.slow_queries import SLOW_QUERIES
+
+
+# Vue de consultation du journal des requêtes lentes
+class SlowQueryLogView(APIView):
+    """
+    Dernières requêtes SQL lentes (plus récentes d'abord), avec la vue, la
+    ligne de code et le plan d'exécution. DELETE vide le journal.
+    Accessible uniquement aux managers.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    def get(self, request):
+        # Only managers can read the slow query log
+        if not request.user.is_manager():
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        
+        return Response({
+            'enabled': settings.SLOW_QUERY_LOG,
+            'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+            'queries': list(reversed(SLOW_QUERIES))
+        })
+    
+    def delete(self, request):
+        if not request.user.is_manager():
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        
+        SLOW_QUERIES.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Profilage à la demande (voir order_management/profiling.py)
+class ProfileTokenView(APIView):
+    """
+    Délivre un jeton à envoyer dans l'en-tête `X-Profile` des requêtes à
+    profiler. Accessible uniquement aux managers.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    def post(self, request):
+        if not request.user.is_manager():
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        
+        return Response({
+            'token': make_profile_token(request.user),
+            'expires_in': settings.PROFILE_TOKEN_MAX_AGE
+        })
+
+
+class ProfileFileView(APIView):
+    """
+    Liste des profils enregistrés (plus récents d'abord), ou téléchargement
+    de l'un d'eux. Accessible uniquement aux managers.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    def get(self, request, filename=None):
+        if not request.user.is_manager():
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        
+        directory = settings.PROFILE_OUTPUT_DIR
+        if filename is None:
+            filenames = sorted(os.listdir(directory), reverse=True) if os.path.isdir(directory) else []
+            return Response([
+                {'filename': name, 'size': os.path.getsize(os.path.join(directory, name))}
+                for name in filenames
+            ])
+        
+        path = os.path.join(directory, os.path.basename(filename))
+        if not os.path.isfile(path):
+            return Response({"error": "Profil non trouvé"}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
@@ -0,0 +1,35 @@
+from rest_framework import status, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .importers import rows_from_csv, rows_from_prestashop, import_orders, ImportSourceError
+
+
+# Vue d'import groupé des commandes (CSV ou PrestaShop)
+class OrderImportView(APIView):
+    """
+    Importe des commandes en masse, soit depuis un fichier CSV envoyé dans
+    le champ `file` (colonnes reference, cart_number, line_count), soit
+    depuis l'API PrestaShop avec `{"source": "prestashop", "date": "YYYY-MM-DD"}`.
+    Accessible uniquement aux managers.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    def post(self, request):
+        # Only managers can import orders
+        if not request.user.is_manager():
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            if 'file' in request.FILES:
+                rows = rows_from_csv(request.FILES['file'])
+            elif request.data.get('source') == 'prestashop':
+                rows = rows_from_prestashop(request.data.get('date'))
+            else:
+                return Response({"error": "Fichier CSV ou source 'prestashop' requis"},
+                                status=status.HTTP_400_BAD_REQUEST)
+        except ImportSourceError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        result = import_orders(rows, request.user)
+        return Response(result, status=status.HTTP_201_CREATED if result['created_count'] else status.HTTP_200_OK)
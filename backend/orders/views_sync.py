@@ -0,0 +1,176 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from order_management.sites import default_site, site_database
+
+from .idempotency import idempotent
+from .models import Order
+from .serializers import OrderCreateSerializer
+from .transitions import advance_order, STAGES
+
+# Nombre maximal d'opérations par envoi
+MAX_OPERATIONS = 500
+
+# Décalage d'horloge toléré pour les horodatages envoyés par les terminaux
+CLOCK_SKEW_TOLERANCE = timedelta(minutes=5)
+
+# Horodatage de l'étape précédente, avant lequel une lecture ne peut pas avoir eu lieu
+PREVIOUS_TIMESTAMP_FIELDS = {
+    'prepare': 'created_at',
+    'control': 'prepared_at',
+    'pack': 'controlled_at',
+}
+
+
+class SyncError(Exception):
+    """Opération refusée : erreur de données ou conflit avec l'état du serveur"""
+    
+    def __init__(self, message, conflict=False, order=None):
+        super().__init__(message)
+        self.conflict = conflict
+        self.order = order
+
+
+# Vue de synchronisation des lectures effectuées hors connexion
+class OrderSyncView(APIView):
+    """
+    Applique dans l'ordre, en une seule transaction, les opérations
+    enregistrées par un terminal mobile hors connexion :
+        
+        {"operations": [
+            {"op": "create", "reference": "...", "cart_number": "...", "timestamp": "..."},
+            {"op": "prepare", "reference": "...", "line_count": 3, "timestamp": "..."},
+            {"op": "control", "reference": "...", "timestamp": "..."},
+            {"op": "pack", "reference": "...", "timestamp": "..."}
+        ]}
+    
+    Chaque opération est isolée dans un point de sauvegarde : un conflit
+    n'annule que l'opération concernée. Les horodatages des lectures sont
+    conservés dans created_at / prepared_at / controlled_at / packed_at ; une
+    lecture antérieure à l'étape précédente de la commande est refusée.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    
+    @idempotent
+    def post(self, request):
+        operations = request.data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return Response({"error": "Aucune opération à synchroniser"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > MAX_OPERATIONS:
+            return Response({"error": f"{MAX_OPERATIONS} opérations maximum par envoi"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        results = []
+        with transaction.atomic(using=site_database()):
+            for index, operation in enumerate(operations):
+                result = {'index': index}
+                if isinstance(operation, dict):
+                    result['op'] = operation.get('op')
+                    result['reference'] = operation.get('reference')
+                try:
+                    with transaction.atomic(using=site_database()):
+                        order = self.apply_operation(request, operation)
+                    result.update({'result': 'ok', 'order_id': order.id, 'status': order.status, 'version': order.version})
+                except SyncError as error:
+                    result.update({'result': 'conflict' if error.conflict else 'error', 'error': str(error)})
+                    if error.order is not None:
+                        result.update({'order_id': error.order.id, 'status': error.order.status, 'version': error.order.version})
+                results.append(result)
+        
+        summary = {}
+        for result in results:
+            summary[result['result']] = summary.get(result['result'], 0) + 1
+        
+        return Response({'summary': summary, 'results': results})
+    
+    def apply_operation(self, request, operation):
+        if not isinstance(operation, dict):
+            raise SyncError("Opération invalide")
+        
+        op = operation.get('op')
+        timestamp = self.parse_timestamp(operation.get('timestamp'))
+        
+        if op == 'create':
+            serializer = OrderCreateSerializer(data=operation, context={'request': request})
+            if not serializer.is_valid():
+                conflict = Order.all_sites.filter(site=default_site(), reference=operation.get('reference')).first()
+                raise SyncError(self.format_errors(serializer.errors), conflict=conflict is not None, order=conflict)
+            return serializer.save(created_at=timestamp)
+        
+        if op not in STAGES:
+            raise SyncError("Opération inconnue (create, prepare, control ou pack)")
+        
+        order = self.get_order(operation)
+        if order.status != STAGES[op]['from_status']:
+            raise SyncError("La commande n'est pas en attente de cette étape", conflict=True, order=order)
+        if order.is_claimed_by_other(request.user):
+            raise SyncError("Cette commande est réservée par un autre agent", conflict=True, order=order)
+        
+        # Une lecture antérieure à l'étape précédente donnerait des durées négatives
+        previous_timestamp = getattr(order, PREVIOUS_TIMESTAMP_FIELDS[op])
+        if previous_timestamp is not None and timestamp < previous_timestamp:
+            raise SyncError(
+                f"Horodatage antérieur à l'étape précédente ({timezone.localtime(previous_timestamp).isoformat()})",
+                order=order
+            )
+        
+        extra_fields = []
+        if op == 'prepare' and operation.get('line_count') is not None:
+            try:
+                line_count = int(operation['line_count'])
+            except (ValueError, TypeError):
+                line_count = 0
+            if line_count < 1:
+                raise SyncError("Le nombre de lignes doit être un entier positif")
+            order.line_count = line_count
+            extra_fields.append('line_count')
+        
+        if not advance_order(order, op, request.user, timestamp, extra_fields):
+            raise SyncError("La commande a été modifiée par un autre utilisateur", conflict=True,
+                            order=Order.objects.get(pk=order.pk))
+        return order
+    
+    def get_order(self, operation):
+        lookup = {}
+        order_id, reference = operation.get('order_id'), operation.get('reference')
+        if order_id is not None:
+            # Valeur scalaire uniquement : une liste ou un objet ferait échouer l'ORM
+            if isinstance(order_id, bool) or not isinstance(order_id, (int, str)):
+                raise SyncError("Identifiant de commande invalide")
+            lookup['pk'] = order_id
+        elif reference:
+            if not isinstance(reference, str):
+                raise SyncError("Référence de commande invalide")
+            lookup['reference'] = reference
+        else:
+            raise SyncError("Référence ou identifiant de commande requis")
+        try:
+            return Order.objects.get(**lookup)
+        except (Order.DoesNotExist, ValueError):
+            raise SyncError("Commande non trouvée")
+    
+    def parse_timestamp(self, value):
+        """Horodatage de la lecture sur le terminal, ou l'heure du serveur à défaut"""
+        if not value:
+            return timezone.now()
+        try:
+            timestamp = parse_datetime(str(value))
+        except ValueError:
+            # Format correct mais date impossible (30 février...)
+            timestamp = None
+        if timestamp is None:
+            raise SyncError("Horodatage invalide (format ISO 8601 attendu)")
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+        if timestamp > timezone.now() + CLOCK_SKEW_TOLERANCE:
+            raise SyncError("Horodatage dans le futur")
+        return timestamp
+    
+    def format_errors(self, errors):
+        return " ".join(str(message) for messages in errors.values() for message in messages)
@@ -1,10 +1,14 @@
+import os
 import requests
 from datetime import datetime
 
+# Clé de l'API lue dans l'environnement : PRESTASHOP_API_KEY=... python presta_test.py
+API_KEY = os.environ['PRESTASHOP_API_KEY']
+
 url = "http://192.168.1.114/presta16/api/orders"
 params = {
     "output_format": "JSON",
-    "ws_key": "6Y9TCUSXG5N3HRBV46D4EMV5ILW1FV6F",
+    "ws_key": API_KEY,
     "display": "full"
 }
 response = requests.get(url, params=params)
@@ -24,7 +28,7 @@ for order in orders:
             cust_url = f"http://192.168.1.114/presta16/api/customers/{id_customer}"
             cust_params = {
                 "output_format": "JSON",
-                "ws_key": "6Y9TCUSXG5N3HRBV46D4EMV5ILW1FV6F"
+                "ws_key": API_KEY
             }
             cust_resp = requests.get(cust_url, params=cust_params)
             if cust_resp.status_code == 200:
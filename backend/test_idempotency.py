@@ -0,0 +1,73 @@
+# test_idempotency.py
+"""
+Vérifie que des requêtes dupliquées envoyées en parallèle avec le même
+en-tête Idempotency-Key ne créent qu'une seule commande.
+Utilisation: python test_idempotency.py (serveur lancé sur localhost:8000)
+"""
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://localhost:8000/api"
+PARALLEL_REQUESTS = 10
+
+
+def login(username, password):
+    """Retourne le jeton d'accès de l'utilisateur"""
+    response = requests.post(f"{BASE_URL}/auth/login/", data={
+        "username": username,
+        "password": password
+    })
+    response.raise_for_status()
+    return response.json()['access']
+
+
+def create_order(token, key, reference):
+    """Crée une commande avec la clé d'idempotence donnée"""
+    response = requests.post(f"{BASE_URL}/orders/", headers={
+        "Authorization": f"Bearer {token}",
+        "Idempotency-Key": key
+    }, data={
+        "reference": reference,
+        "cart_number": "TEST-IDEMPOTENCE"
+    })
+    return response.status_code, response.headers.get('Idempotent-Replayed'), response.json()
+
+
+def main():
+    token = login("agent1", "password123")
+    key = str(uuid.uuid4())
+    reference = f"IDEMP-{key[:8].upper()}"
+    
+    print(f"\n--- {PARALLEL_REQUESTS} créations parallèles de {reference} avec la même clé ---")
+    with ThreadPoolExecutor(max_workers=PARALLEL_REQUESTS) as executor:
+        results = list(executor.map(
+            lambda _: create_order(token, key, reference), range(PARALLEL_REQUESTS)
+        ))
+    
+    for status_code, replayed, body in results:
+        print(f"Status Code: {status_code} - Rejouée: {replayed or 'non'}")
+    
+    created_ids = {body.get('id') for status_code, replayed, body in results if status_code == 201}
+    unexpected = [status_code for status_code, replayed, body in results if status_code not in (201, 409)]
+    
+    # Une seule commande créée, les autres réponses sont des rejeux ou « en cours »
+    if len(created_ids) == 1 and not unexpected:
+        print(f"OK: une seule commande créée (id {created_ids.pop()})")
+    else:
+        print(f"ÉCHEC: commandes créées {created_ids}, réponses inattendues {unexpected}")
+        sys.exit(1)
+    
+    print("\n--- Rejeu séquentiel ---")
+    status_code, replayed, body = create_order(token, key, reference)
+    print(f"Status Code: {status_code} - Rejouée: {replayed or 'non'}")
+    if status_code != 201 or replayed != 'true':
+        print("ÉCHEC: la réponse mémorisée n'a pas été renvoyée")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
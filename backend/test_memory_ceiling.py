@@ -0,0 +1,121 @@
+# test_memory_ceiling.py
+"""
+Vérifie que la mémoire allouée par les listes de commandes reste sous un
+plafond proportionnel au nombre de commandes renvoyées.
+
+Le serveur doit être lancé avec la mesure mémoire activée sur ces routes :
+    MEMORY_PROFILE_ROUTES=order-list-create,preparation-list python manage.py runserver
+Utilisation: python test_memory_ceiling.py --orders 1000
+(les commandes manquantes sont créées par l'import CSV, préfixe MEMTEST-,
+puis supprimées en fin d'exécution ; --keep pour les conserver)
+"""
+import argparse
+import io
+import sys
+
+import requests
+
+BASE_URL = "http://localhost:8000/api"
+
+REFERENCE_PREFIX = "MEMTEST-"
+
+# Commandes supprimées par requête lors du nettoyage
+DELETE_BATCH_SIZE = 500
+
+# Plafond d'allocation : socle fixe + budget par commande renvoyée (Ko)
+BASE_KB = 2048
+CEILINGS_PER_ORDER_KB = {
+    "/orders/?date=all": 6,
+    "/orders/?date=all&format=compact": 4,
+    "/orders/?date=all&format=columnar": 4,
+    "/orders/preparation/": 6,
+}
+
+
+def login(username, password):
+    """Retourne le jeton d'accès de l'utilisateur"""
+    response = requests.post(f"{BASE_URL}/auth/login/", data={
+        "username": username,
+        "password": password
+    })
+    response.raise_for_status()
+    return response.json()['access']
+
+
+def ensure_orders(headers, count):
+    """Importe des commandes MEMTEST-xxxxx jusqu'à en avoir `count` du jour"""
+    csv_content = io.StringIO()
+    csv_content.write("reference,cart_number,line_count\n")
+    for index in range(count):
+        csv_content.write(f"{REFERENCE_PREFIX}{index:05d},{REFERENCE_PREFIX}{index % 50:02d},{index % 20 + 1}\n")
+    response = requests.post(f"{BASE_URL}/orders/import/", headers=headers, files={
+        "file": ("memtest.csv", csv_content.getvalue().encode(), "text/csv")
+    })
+    response.raise_for_status()
+    print(f"{response.json()['created_count']} commande(s) importée(s)")
+
+
+def cleanup(headers):
+    """Supprime les commandes MEMTEST- (celles de cette exécution et des précédentes)"""
+    response = requests.get(f"{BASE_URL}/orders/", headers=headers, params={
+        "date": "all", "search": REFERENCE_PREFIX
+    })
+    response.raise_for_status()
+    order_ids = [order['id'] for order in response.json()]
+    for start in range(0, len(order_ids), DELETE_BATCH_SIZE):
+        response = requests.post(f"{BASE_URL}/orders/delete/", headers=headers, json={
+            "order_ids": order_ids[start:start + DELETE_BATCH_SIZE]
+        })
+        response.raise_for_status()
+    print(f"Nettoyage : {len(order_ids)} commande(s) {REFERENCE_PREFIX} supprimée(s)")
+
+
+def order_count(body):
+    if isinstance(body, list):
+        return len(body)
+    orders = body.get('orders', body.get('results', []))
+    if isinstance(orders, dict):
+        # Format columnar : un tableau par champ
+        return len(orders.get('id', []))
+    return len(orders)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plafonds mémoire des listes de commandes")
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='1234')
+    parser.add_argument('--keep', action='store_true', help="Conserver les commandes MEMTEST- importées")
+    args = parser.parse_args()
+    
+    headers = {"Authorization": f"Bearer {login(args.username, args.password)}"}
+    failures = []
+    try:
+        ensure_orders(headers, args.orders)
+        
+        for path, per_order_kb in CEILINGS_PER_ORDER_KB.items():
+            response = requests.get(f"{BASE_URL}{path}", headers=headers)
+            response.raise_for_status()
+            peak = response.headers.get('X-Memory-Peak-KB')
+            if peak is None:
+                print(f"ÉCHEC: {path} n'est pas mesuré (voir MEMORY_PROFILE_ROUTES)")
+                failures.append(path)
+                continue
+            
+            count = order_count(response.json())
+            ceiling = BASE_KB + per_order_kb * count
+            result = "OK" if int(peak) <= ceiling else "ÉCHEC"
+            print(f"{result}: {path} - {count} commandes, pic {peak} Ko (plafond {ceiling} Ko)")
+            print(f"    {response.headers.get('X-Memory-Top')}")
+            if result != "OK":
+                failures.append(path)
+    finally:
+        if not args.keep:
+            cleanup(headers)
+    
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()